@@ -0,0 +1,120 @@
+"""Startup benchmark of lab_orchestrator_lib_auth.
+
+Measures in fresh interpreters how long importing ``lab_orchestrator_lib_auth.auth`` takes and how long it takes until
+the first token is created or verified, which includes loading PyJWT and cryptography. The results can be saved as json
+baseline and compared to a later run:
+
+    PYTHONPATH=src python3 benchmarks/bench_import.py --output import-baseline.json
+    PYTHONPATH=src python3 benchmarks/bench_import.py --compare import-baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+SECRET_KEY = "8560e6637120e49406a631ed91d2302bc280474f26860920f1249d6f213c78b7"
+
+SCENARIOS = {
+    'import': "",
+    'first-generate': "token = auth.generate_auth_token(5, params, %r)" % SECRET_KEY,
+    'first-verify': "auth.verify_auth_token(auth.generate_auth_token(5, params, %r), 'ubuntu', %r)" % (SECRET_KEY,
+                                                                                                     SECRET_KEY),
+}
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+from lab_orchestrator_lib_auth import auth
+params = auth.LabInstanceTokenParams(1, 9, 'pentest-ubuntu-3-9', ['ubuntu'])
+%s
+end = time.perf_counter()
+print(end - start, type(sys.modules.get('jwt')) is type(sys))
+"""
+
+
+def measure(scenario: str, rounds: int) -> Dict[str, Any]:
+    """Runs a scenario in fresh interpreters and returns the timing statistics in milliseconds."""
+    env = dict(os.environ)
+    source = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [source, env.get('PYTHONPATH')]))
+    samples: List[float] = []
+    jwt_loaded = False
+    for _ in range(rounds):
+        output = subprocess.run([sys.executable, '-c', SCRIPT % SCENARIOS[scenario]], env=env, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout.split()
+        samples.append(float(output[0]) * 1000)
+        jwt_loaded = output[1] == 'True'
+    return {
+        'rounds': rounds,
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'max_ms': max(samples),
+        'jwt_loaded': jwt_loaded,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    results = []
+    for scenario in args.scenarios:
+        stats = measure(scenario, args.rounds)
+        results.append({'name': scenario, **stats})
+        print('%-16s median %8.2f ms  min %8.2f ms  max %8.2f ms  jwt loaded: %s' % (
+            scenario, stats['median_ms'], stats['min_ms'], stats['max_ms'], stats['jwt_loaded']))
+    return {
+        'meta': {
+            'created_at': time.time(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Prints the change of the median time against a baseline and returns False if a scenario got slower than threshold."""
+    baseline_results = {result['name']: result for result in baseline['results']}
+    ok = True
+    print('\nCompared to baseline:')
+    for result in current['results']:
+        old = baseline_results.get(result['name'])
+        if old is None:
+            continue
+        change = result['median_ms'] / old['median_ms'] - 1
+        marker = ''
+        if change > threshold:
+            marker = '  REGRESSION'
+            ok = False
+        print('%-16s %+7.1f%%%s' % (result['name'], change * 100, marker))
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--rounds', type=int, default=20, help='Fresh interpreters per scenario.')
+    parser.add_argument('--output', help='Save the results as json baseline to this file.')
+    parser.add_argument('--compare', help='Compare the results to a json baseline.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed increase of the median time compared to the baseline, e.g. 0.2 for 20%%.')
+    args = parser.parse_args()
+
+    current = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if not compare(current, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""Load test of verify_auth_token that simulates the reconnect storm after a proxy restart.
+
+Creates a population of tokens with generate_auth_token and replays a trace of verifications at once through the sync,
+the threaded and the asyncio API. The trace mixes hot tokens that reconnect often, expired tokens, VMs that aren't
+allowed in the token and tokens with a bad signature. Reports throughput, latency percentiles and the CPU time per
+verification of every mode. The results can be saved as json baseline and compared to a later run:
+
+    PYTHONPATH=src python3 benchmarks/loadtest.py --output loadtest-baseline.json
+    PYTHONPATH=src python3 benchmarks/loadtest.py --algorithm RS256 --cache --compare loadtest-baseline.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import jwt
+
+import lab_orchestrator_lib_auth
+from lab_orchestrator_lib_auth import auth
+from lab_orchestrator_lib_auth.aio import AsyncTokenVerifier
+from lab_orchestrator_lib_auth.cache import VerifiedTokenCache
+from run_benchmarks import EXPIRES_AT, create_keys
+
+
+MODES = ['sync', 'threaded', 'asyncio']
+KINDS = ['ok', 'expired', 'forbidden', 'bad-signature']
+EXPIRED_AT = 1000000000
+
+Request = Tuple[str, str, str]
+
+
+def create_trace(args: argparse.Namespace, signing_key: Any, other_key: Any) -> List[Request]:
+    """Creates the tokens and returns the requests as (expected outcome, token, vmi_name) in random order."""
+    rng = random.Random(args.seed)
+
+    def generate(user_id: int, key: Any, expires_at: int) -> Tuple[str, List[str]]:
+        vmi_names = ['vmi-%d' % i for i in range(args.vmi_count)]
+        params = auth.LabInstanceTokenParams(1, user_id, 'pentest-ubuntu-3-%d' % user_id, vmi_names)
+        return auth.generate_auth_token(user_id, params, key, expires_at=expires_at, algorithm=args.algorithm), \
+            vmi_names
+
+    population = [generate(user_id, signing_key, EXPIRES_AT) for user_id in range(args.tokens)]
+    hot_count = max(1, int(args.tokens * args.hot_tokens))
+    shares = {'expired': args.expired, 'forbidden': args.forbidden, 'bad-signature': args.bad_signature}
+    counts = {kind: int(args.requests * share) for kind, share in shares.items()}
+    counts['ok'] = args.requests - sum(counts.values())
+    if counts['ok'] < 0:
+        raise ValueError("The shares of expired, forbidden and bad signature requests are greater than 1")
+
+    def pick() -> Tuple[str, List[str]]:
+        if hot_count == args.tokens or rng.random() < args.hot_share:
+            return population[rng.randrange(hot_count)]
+        return population[rng.randrange(hot_count, args.tokens)]
+
+    trace: List[Request] = []
+    for _ in range(counts['ok']):
+        token, vmi_names = pick()
+        trace.append(('ok', token, rng.choice(vmi_names)))
+    for _ in range(counts['forbidden']):
+        trace.append(('forbidden', pick()[0], 'not-allowed'))
+    # clients of the old proxy that still have tokens from a previous session or of another deployment
+    for user_id in range(counts['expired']):
+        token, vmi_names = generate(args.tokens + user_id, signing_key, EXPIRED_AT)
+        trace.append(('expired', token, vmi_names[0]))
+    for user_id in range(counts['bad-signature']):
+        token, vmi_names = generate(user_id % args.tokens, other_key, EXPIRES_AT)
+        trace.append(('bad-signature', token, vmi_names[0]))
+    rng.shuffle(trace)
+    return trace
+
+
+def error_outcome(error: jwt.exceptions.InvalidTokenError) -> str:
+    if isinstance(error, jwt.exceptions.ExpiredSignatureError):
+        return 'expired'
+    if isinstance(error, jwt.exceptions.InvalidSignatureError):
+        return 'bad-signature'
+    return error.__class__.__name__
+
+
+def timed(verifier: auth.TokenVerifier, request: Request) -> Tuple[str, int]:
+    timer = time.perf_counter_ns
+    start = timer()
+    try:
+        allowed, _ = verifier.verify(request[1], request[2])
+        result = 'ok' if allowed else 'forbidden'
+    except jwt.exceptions.InvalidTokenError as e:
+        result = error_outcome(e)
+    return result, timer() - start
+
+
+def run_sync(verifier: auth.TokenVerifier, trace: List[Request], args: argparse.Namespace) -> List[Tuple[str, int]]:
+    return [timed(verifier, request) for request in trace]
+
+
+def run_threaded(verifier: auth.TokenVerifier, trace: List[Request],
+                 args: argparse.Namespace) -> List[Tuple[str, int]]:
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        return list(executor.map(lambda request: timed(verifier, request), trace))
+
+
+def run_asyncio(verifier: auth.TokenVerifier, trace: List[Request], args: argparse.Namespace) -> List[Tuple[str, int]]:
+    """Every request is a connection handler. Latencies include waiting for the executor and coalesced verifications."""
+
+    async def storm() -> List[Tuple[str, int]]:
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            async_verifier = AsyncTokenVerifier(verifier, executor)
+            semaphore = asyncio.Semaphore(args.concurrency)
+            timer = time.perf_counter_ns
+
+            async def handle(request: Request) -> Tuple[str, int]:
+                async with semaphore:
+                    start = timer()
+                    try:
+                        allowed, _ = await async_verifier.verify(request[1], request[2])
+                        result = 'ok' if allowed else 'forbidden'
+                    except jwt.exceptions.InvalidTokenError as e:
+                        result = error_outcome(e)
+                    return result, timer() - start
+
+            return await asyncio.gather(*(handle(request) for request in trace))
+
+    return asyncio.run(storm())
+
+
+RUNNERS = {'sync': run_sync, 'threaded': run_threaded, 'asyncio': run_asyncio}
+
+
+def measure(mode: str, verification_key: Any, trace: List[Request], args: argparse.Namespace) -> Dict[str, Any]:
+    """Replays the trace with a new verifier and cache and returns the statistics of the mode."""
+    cache = VerifiedTokenCache(maxsize=args.tokens) if args.cache else None
+    verifier = auth.TokenVerifier(verification_key, [args.algorithm], cache=cache)
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    results = RUNNERS[mode](verifier, trace, args)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    samples = sorted(latency for _, latency in results)
+    outcomes: Dict[str, int] = {}
+    mismatches = 0
+    for (expected, _, _), (result, _) in zip(trace, results):
+        outcomes[result] = outcomes.get(result, 0) + 1
+        mismatches += result != expected
+
+    def percentile(p: float) -> float:
+        return samples[min(len(samples) - 1, int(len(samples) * p))] / 1000
+
+    return {
+        'requests': len(trace),
+        'verifications_per_sec': len(trace) / wall,
+        'wall_s': wall,
+        'cpu_us_per_verification': cpu / len(trace) * 1e6,
+        'p50_us': percentile(0.50),
+        'p90_us': percentile(0.90),
+        'p99_us': percentile(0.99),
+        'p999_us': percentile(0.999),
+        'max_us': samples[-1] / 1000,
+        'outcomes': outcomes,
+        'mismatches': mismatches,
+        'cache_hits': cache.hits if cache is not None else 0,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    signing_key, verification_key = create_keys()[args.algorithm]
+    # signed with a key of the same algorithm that the verifier doesn't know
+    trace = create_trace(args, signing_key, create_keys()[args.algorithm][0] if args.algorithm != 'HS256' else 'x' * 64)
+    expected: Dict[str, int] = {}
+    for kind, _, _ in trace:
+        expected[kind] = expected.get(kind, 0) + 1
+    print('%d requests for %d tokens (%s): %s' % (len(trace), args.tokens, args.algorithm, ', '.join(
+        '%s %d' % (kind, expected.get(kind, 0)) for kind in KINDS)))
+    results = []
+    for mode in args.modes:
+        stats = measure(mode, verification_key, trace, args)
+        results.append({'name': '%s-%s%s' % (mode, args.algorithm, '-cache' if args.cache else ''), 'mode': mode,
+                        **stats})
+        print('%-20s %10.0f verifications/s  p50 %9.1f us  p99 %9.1f us  p99.9 %9.1f us  cpu %8.1f us%s' % (
+            results[-1]['name'], stats['verifications_per_sec'], stats['p50_us'], stats['p99_us'], stats['p999_us'],
+            stats['cpu_us_per_verification'], '  MISMATCHES: %d' % stats['mismatches'] if stats['mismatches'] else ''))
+    return {
+        'meta': {
+            'created_at': time.time(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'pyjwt': jwt.__version__,
+            'lab_orchestrator_lib_auth': lab_orchestrator_lib_auth.__version__,
+            'args': vars(args),
+        },
+        'results': results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Prints the change of throughput and p99 latency against a baseline and returns False if a mode regressed."""
+    baseline_results = {result['name']: result for result in baseline['results']}
+    ok = True
+    print('\nCompared to baseline (%s, pyjwt %s):' % (baseline['meta']['lab_orchestrator_lib_auth'],
+                                                        baseline['meta']['pyjwt']))
+    for result in current['results']:
+        old = baseline_results.get(result['name'])
+        if old is None:
+            continue
+        throughput = result['verifications_per_sec'] / old['verifications_per_sec'] - 1
+        latency = result['p99_us'] / old['p99_us'] - 1
+        marker = ''
+        if throughput < -threshold or latency > threshold:
+            marker = '  REGRESSION'
+            ok = False
+        print('%-20s throughput %+7.1f%%  p99 %+7.1f%%%s' % (result['name'], throughput * 100, latency * 100, marker))
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--algorithm', choices=['HS256', 'RS256', 'ES256'], default='HS256')
+    parser.add_argument('--tokens', type=int, default=1000, help='Amount of valid tokens.')
+    parser.add_argument('--requests', type=int, default=20000, help='Verifications per mode.')
+    parser.add_argument('--vmi-count', type=int, default=3, help='Allowed VM-names per token.')
+    parser.add_argument('--hot-tokens', type=float, default=0.1, help='Share of the tokens that are hot.')
+    parser.add_argument('--hot-share', type=float, default=0.8, help='Share of the valid requests with hot tokens.')
+    parser.add_argument('--expired', type=float, default=0.1, help='Share of the requests with expired tokens.')
+    parser.add_argument('--forbidden', type=float, default=0.05, help='Share of the requests for a forbidden VM.')
+    parser.add_argument('--bad-signature', type=float, default=0.02,
+                        help='Share of the requests with a bad signature.')
+    parser.add_argument('--threads', type=int, default=8, help='Threads of the threaded and asyncio mode.')
+    parser.add_argument('--concurrency', type=int, default=1000, help='Concurrent connections in the asyncio mode.')
+    parser.add_argument('--cache', action='store_true', help='Use a VerifiedTokenCache.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the trace.')
+    parser.add_argument('--output', help='Save the results as json baseline to this file.')
+    parser.add_argument('--compare', help='Compare the results to a json baseline.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Allowed loss of throughput and increase of p99 latency, e.g. 0.1 for 10%%.')
+    args = parser.parse_args()
+
+    current = run(args)
+    ok = all(result['mismatches'] == 0 for result in current['results'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        ok = compare(current, baseline, args.threshold) and ok
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
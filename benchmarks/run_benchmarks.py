@@ -0,0 +1,206 @@
+"""Benchmarks of generate_auth_token, decode_auth_token and verify_auth_token.
+
+Runs every operation for HS256, RS256 and ES256 with different amounts of allowed VMI names and sizes of additional data
+and reports operations per second, latency percentiles and the peak memory that is allocated per call. It also measures
+how much memory a decoded ``LabInstanceTokenParams`` and ``FrozenLabInstanceTokenParams`` keeps alive. The results can
+be saved as json baseline and compared to a later run:
+
+    PYTHONPATH=src python3 benchmarks/run_benchmarks.py --output baseline.json
+    PYTHONPATH=src python3 benchmarks/run_benchmarks.py --compare baseline.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+import lab_orchestrator_lib_auth
+from lab_orchestrator_lib_auth import auth
+
+
+EXPIRES_AT = 8633272048
+VMI_COUNTS = [1, 10, 100, 1000, 10000]
+PAYLOAD_SIZES = [0, 1024, 65536]
+
+
+def create_keys() -> Dict[str, Tuple[Any, Any]]:
+    """Creates a (signing key, verification key) pair in PEM format for every algorithm."""
+    pem = serialization.Encoding.PEM
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ec_key = ec.generate_private_key(ec.SECP256R1())
+    keys = {'HS256': ("8560e6637120e49406a631ed91d2302bc280474f26860920f1249d6f213c78b7",) * 2}
+    for algorithm, private_key in (('RS256', rsa_key), ('ES256', ec_key)):
+        private_pem = private_key.private_bytes(pem, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        public_pem = private_key.public_key().public_bytes(pem, serialization.PublicFormat.SubjectPublicKeyInfo)
+        keys[algorithm] = (private_pem.decode(), public_pem.decode())
+    return keys
+
+
+def create_params(vmi_count: int, payload_size: int) -> auth.LabInstanceTokenParams:
+    additional_data = {'data': 'x' * payload_size} if payload_size else None
+    allowed_vmi_names = ['vmi-%d' % i for i in range(vmi_count)]
+    return auth.LabInstanceTokenParams(1, 9, 'pentest-ubuntu-3-9', allowed_vmi_names, additional_data)
+
+
+def measure(function: Callable[[], Any], min_time: float, min_rounds: int) -> Dict[str, float]:
+    """Calls a function until min_time is reached and returns throughput, latency and allocation statistics."""
+    function()
+    timer = time.perf_counter_ns
+    samples: List[int] = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < min_rounds or time.perf_counter() < deadline:
+        start = timer()
+        function()
+        samples.append(timer() - start)
+    samples.sort()
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    def percentile(p: float) -> float:
+        return samples[min(len(samples) - 1, int(len(samples) * p))] / 1000
+
+    return {
+        'rounds': len(samples),
+        'ops_per_sec': 1e9 / statistics.mean(samples),
+        'p50_us': percentile(0.50),
+        'p90_us': percentile(0.90),
+        'p99_us': percentile(0.99),
+        'alloc_peak_bytes': peak,
+    }
+
+
+def measure_memory(params_class: type, token: str, verification_key: Any, algorithm: str,
+                   count: int) -> Dict[str, float]:
+    """Decodes a token count times, keeps the params and returns the retained bytes per params object."""
+    verifier = auth.TokenVerifier(verification_key, [algorithm], params_class=params_class)
+    verifier.decode(token)
+    decoded: List[Any] = [None] * count
+    tracemalloc.start()
+    for i in range(count):
+        decoded[i] = verifier.decode(token)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'objects': count, 'bytes_per_object': current / count}
+
+
+def cases(algorithms: List[str], vmi_counts: List[int], payload_sizes: List[int]) -> List[Tuple[str, int, int]]:
+    """VMI counts are measured without additional data and additional data sizes with one VMI name."""
+    result = []
+    for algorithm in algorithms:
+        for vmi_count in vmi_counts:
+            result.append((algorithm, vmi_count, 0))
+        for payload_size in payload_sizes:
+            if payload_size:
+                result.append((algorithm, 1, payload_size))
+    return result
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    keys = create_keys()
+    results = []
+    for algorithm, vmi_count, payload_size in cases(args.algorithms, args.vmi_counts, args.payload_sizes):
+        signing_key, verification_key = keys[algorithm]
+        params = create_params(vmi_count, payload_size)
+        token = auth.generate_auth_token(5, params, signing_key, expires_at=EXPIRES_AT, algorithm=algorithm)
+        vmi_name = params.allowed_vmi_names[-1]
+        operations = {
+            'generate': lambda: auth.generate_auth_token(5, params, signing_key, expires_at=EXPIRES_AT,
+                                                         algorithm=algorithm),
+            'decode': lambda: auth.decode_auth_token(token, verification_key, algorithms=[algorithm]),
+            'verify': lambda: auth.verify_auth_token(token, vmi_name, verification_key, algorithms=[algorithm]),
+        }
+        for operation, function in operations.items():
+            name = '%s-%s-vmi%d-data%d' % (operation, algorithm, vmi_count, payload_size)
+            stats = measure(function, args.min_time, args.min_rounds)
+            results.append({'name': name, 'operation': operation, 'algorithm': algorithm, 'vmi_count': vmi_count,
+                            'payload_bytes': payload_size, **stats})
+            print('%-34s %12.0f ops/s  p50 %9.1f us  p99 %9.1f us  peak %9d B' % (
+                name, stats['ops_per_sec'], stats['p50_us'], stats['p99_us'], stats['alloc_peak_bytes']))
+    if args.memory_count:
+        signing_key, verification_key = keys['HS256']
+        for vmi_count in (2, 100):
+            token = auth.generate_auth_token(5, create_params(vmi_count, 0), signing_key, expires_at=EXPIRES_AT)
+            for label, params_class in (('params', auth.LabInstanceTokenParams),
+                                        ('frozen', auth.FrozenLabInstanceTokenParams)):
+                name = 'memory-%s-vmi%d' % (label, vmi_count)
+                stats = measure_memory(params_class, token, verification_key, 'HS256', args.memory_count)
+                results.append({'name': name, 'operation': 'memory', 'vmi_count': vmi_count, **stats})
+                print('%-34s %12.1f B per decoded params' % (name, stats['bytes_per_object']))
+    return {
+        'meta': {
+            'created_at': time.time(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'pyjwt': jwt.__version__,
+            'lab_orchestrator_lib_auth': lab_orchestrator_lib_auth.__version__,
+        },
+        'results': results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Prints the change of throughput and memory against a baseline and returns False if a case regressed more than
+    threshold."""
+    baseline_results = {result['name']: result for result in baseline['results']}
+    ok = True
+    print('\nCompared to baseline (%s, pyjwt %s):' % (baseline['meta']['lab_orchestrator_lib_auth'],
+                                                        baseline['meta']['pyjwt']))
+    for result in current['results']:
+        old = baseline_results.get(result['name'])
+        if old is None:
+            continue
+        if 'bytes_per_object' in result:
+            change = result['bytes_per_object'] / old['bytes_per_object'] - 1
+            regression = change > threshold
+        else:
+            change = result['ops_per_sec'] / old['ops_per_sec'] - 1
+            regression = change < -threshold
+        marker = ''
+        if regression:
+            marker = '  REGRESSION'
+            ok = False
+        print('%-34s %+7.1f%%%s' % (result['name'], change * 100, marker))
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--algorithms', nargs='+', default=['HS256', 'RS256', 'ES256'])
+    parser.add_argument('--vmi-counts', nargs='+', type=int, default=VMI_COUNTS)
+    parser.add_argument('--payload-sizes', nargs='+', type=int, default=PAYLOAD_SIZES)
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per case.')
+    parser.add_argument('--min-rounds', type=int, default=20, help='Minimum calls per case.')
+    parser.add_argument('--memory-count', type=int, default=10000,
+                        help='Decoded params per memory case. 0 disables the memory cases.')
+    parser.add_argument('--output', help='Save the results as json baseline to this file.')
+    parser.add_argument('--compare', help='Compare the results to a json baseline.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Allowed loss of throughput or increase of memory compared to the baseline, e.g. 0.1 for '
+                             '10%%.')
+    args = parser.parse_args()
+
+    current = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        if not compare(current, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Lazy imports of LabOrchestrator auth.
+
+Importing PyJWT also imports ``cryptography``, which takes much longer than importing this library. The modules of this
+library bind PyJWT with ``lazy_import``, so it's only loaded when the first token is created or decoded. Exceptions that
+subclass PyJWT's exceptions are defined with ``LazyExceptions``, so they don't import PyJWT either.
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+
+_lock = threading.Lock()
+_classes_lock = threading.Lock()
+
+
+class LazyModule:
+    """Placeholder of a module that imports the module on the first attribute access.
+
+    The module is imported with a regular import under a lock, so threads that use it for the first time at the same
+    time all get the completely executed module. ``sys.modules`` only contains the module after it was imported.
+
+    :param name: Full name of the module.
+    :param namespace: Optional globals of the module that binds the placeholder. After the import the placeholder is replaced there by the module, so later accesses don't go through the placeholder.
+    :param binding: Name of the placeholder in ``namespace``. If None, the last part of ``name`` is used.
+    """
+    __slots__ = ('_name', '_namespace', '_binding', '_module')
+
+    def __init__(self, name: str, namespace: Optional[Dict[str, Any]] = None, binding: Optional[str] = None):
+        self._name = name
+        self._namespace = namespace
+        self._binding = name.rpartition('.')[2] if binding is None else binding
+        self._module: Optional[ModuleType] = None
+
+    def load(self) -> ModuleType:
+        """Imports the module if it isn't imported yet.
+
+        :return: The module.
+        """
+        module = self._module
+        if module is None:
+            with _lock:
+                module = self._module
+                if module is None:
+                    module = importlib.import_module(self._name)
+                    if self._namespace is not None and self._namespace.get(self._binding) is self:
+                        self._namespace[self._binding] = module
+                    self._module = module
+        return module
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.load(), name)
+
+    def __repr__(self) -> str:
+        return '<lazy module %r>' % self._name
+
+
+def lazy_import(name: str, namespace: Optional[Dict[str, Any]] = None) -> Union[ModuleType, LazyModule]:
+    """Returns a placeholder that imports a module on the first attribute access.
+
+    If the module is already imported, the module itself is returned.
+
+    :param name: Full name of the module.
+    :param namespace: Optional globals of the caller, see ``LazyModule``.
+    :return: The module or a ``LazyModule``.
+    :raise ImportError: Raised when the module can't be found.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ImportError("No module named '%s'" % name, name=name)
+    return LazyModule(name, namespace)
+
+
+class LazyExceptions:
+    """Exception classes of a module that are created on first use, because their base class is in a lazy module.
+
+    A class is created when it's raised by the module with ``errors.Name`` or accessed from outside with
+    ``module.Name`` or ``from module import Name``, which needs ``__getattr__ = errors.get`` in the module. The class is
+    then stored in the globals of the module, so every access gets the same class.
+
+    :param namespace: Globals of the module that defines the classes.
+    :param classes: Maps the name of every class to its base and docstring. The base is the name of another class of this object or a function that returns the base class.
+    """
+
+    def __init__(self, namespace: Dict[str, Any], classes: Dict[str, Tuple[Union[str, Callable[[], type]], str]]):
+        self._namespace = namespace
+        self._classes = classes
+
+    def get(self, name: str) -> type:
+        """Returns a class and creates it if it doesn't exist yet.
+
+        :param name: Name of the class.
+        :return: The class.
+        :raise AttributeError: Raised when the module has no class with this name.
+        """
+        cls = self._namespace.get(name)
+        if cls is not None:
+            return cls
+        try:
+            base, doc = self._classes[name]
+        except KeyError:
+            raise AttributeError("module '%s' has no attribute '%s'" % (self._namespace['__name__'], name)) from None
+        # the base is resolved before taking the lock, because it may import a module or create another class
+        base = self.get(base) if isinstance(base, str) else base()
+        with _classes_lock:
+            cls = self._namespace.get(name)
+            if cls is None:
+                cls = type(name, (base,), {'__doc__': doc, '__module__': self._namespace['__name__']})
+                self._namespace[name] = cls
+        return cls
+
+    def __getattr__(self, name: str) -> type:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.get(name)
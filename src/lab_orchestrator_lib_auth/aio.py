@@ -0,0 +1,140 @@
+"""Asyncio API of LabOrchestrator auth.
+
+Checking signatures is CPU work that blocks the event loop. The functions in this module run the verification in an
+executor and coalesce concurrent requests for the same token, so a reconnect storm only verifies every unique token once.
+"""
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional, Tuple, Union, TYPE_CHECKING
+
+from .auth import LabInstanceTokenParams, Token, TokenVerifier, _get_verifier, _normalize_token
+from .cache import VerifiedTokenCache
+from .json_codec import JsonCodec
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .revocation import RevocationStore
+
+
+class AsyncTokenVerifier:
+    """Asyncio wrapper of a ``TokenVerifier``.
+
+    Tokens are decoded in ``executor``. Concurrent calls with the same token wait for the same decoding. If a waiting
+    call is cancelled, the decoding continues for the other callers.
+
+    :param verifier: The verifier that decodes the tokens.
+    :param executor: Executor that is used to decode the tokens. If None, the default executor of the event loop is used.
+    """
+
+    def __init__(self, verifier: TokenVerifier, executor: Optional[Executor] = None):
+        self.verifier = verifier
+        self.executor = executor
+        self._inflight: Dict[Any, asyncio.Future] = {}
+
+    async def decode(self, token: Token) -> LabInstanceTokenParams:
+        """Decodes a JWT token without blocking the event loop.
+
+        :param token: The token to decode.
+        :return: The data that is contained in the token.
+        :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid. See ``decode_auth_token``.
+        """
+        token = _normalize_token(token)
+        return await _coalesce(self._inflight, token, self.executor, self.verifier, token)
+
+    async def verify(self, token: Token, vmi_name: str) -> Tuple[bool, LabInstanceTokenParams]:
+        """Decodes a token without blocking the event loop and checks if the vmi_name is allowed in the token.
+
+        :param token: The token to decode and verify.
+        :param vmi_name: The vmi_name the user wants to use.
+        :return: The result of the verification as a boolean and the data contained in the token.
+        :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid. See ``verify_auth_token``.
+        """
+        data = await self.decode(token)
+        return data.is_vmi_allowed(vmi_name), data
+
+
+# decodings of the module functions that are in flight. Entries are removed when the decoding is done, so the
+# executors and caches of the calls aren't kept alive.
+_inflight: Dict[Any, asyncio.Future] = {}
+
+
+def _coalesce(inflight: Dict[Any, asyncio.Future], key: Any, executor: Optional[Executor], verifier: TokenVerifier,
+              token: Union[str, bytes]) -> "asyncio.Future[LabInstanceTokenParams]":
+    """Returns a shielded future of the decoding of the token that is in flight under the key or starts it."""
+    loop = asyncio.get_running_loop()
+    future = inflight.get(key)
+    if future is None or future.get_loop() is not loop:
+        future = loop.run_in_executor(executor, verifier.decode, token)
+        inflight[key] = future
+        future.add_done_callback(lambda done: _forget(inflight, key, done))
+    return asyncio.shield(future)
+
+
+def _forget(inflight: Dict[Any, asyncio.Future], key: Any, future: asyncio.Future) -> None:
+    if inflight.get(key) is future:
+        del inflight[key]
+    if not future.cancelled():
+        # mark the exception as retrieved, the waiting callers get it from the shield
+        future.exception()
+
+
+async def _decode(token: Token, secret_key: Any, algorithms: Optional[List[str]], cache: Optional[VerifiedTokenCache],
+                  json_codec: Optional[JsonCodec], revocation_store: Optional["RevocationStore"],
+                  executor: Optional[Executor]) -> LabInstanceTokenParams:
+    if not isinstance(secret_key, (str, bytes)):
+        verifier = _get_verifier(secret_key, algorithms, cache, json_codec, revocation_store)
+        return await AsyncTokenVerifier(verifier, executor).decode(token)
+    token = _normalize_token(token)
+    verifier = _get_verifier(secret_key, algorithms, None, json_codec)
+    # the shared verifier identifies the key, algorithms and codec. The executor doesn't change the result.
+    key = (token, verifier, id(cache), id(revocation_store))
+    if cache is not None or revocation_store is not None:
+        verifier = verifier._with_options(cache, revocation_store)
+    return await _coalesce(_inflight, key, executor, verifier, token)
+
+
+async def decode_auth_token_async(token: str, secret_key: str, algorithms: Optional[List[str]] = None,
+                                  cache: Optional[VerifiedTokenCache] = None,
+                                  executor: Optional[Executor] = None,
+                                  json_codec: Optional[JsonCodec] = None,
+                                  revocation_store: Optional["RevocationStore"] = None) -> LabInstanceTokenParams:
+    """Decodes a JWT token without blocking the event loop.
+
+    Works like ``decode_auth_token``. Concurrent calls with the same token, key and parameters are coalesced if the key
+    is a string or bytes. For other keys create one ``AsyncTokenVerifier`` and reuse it.
+
+    :param token: The token to decode.
+    :param secret_key: Key that should be used to decrypt the token.
+    :param algorithms: Allowed algorithms. If None, ['HS256'] is used.
+    :param cache: Optional cache of verified tokens. See ``decode_auth_token``.
+    :param executor: Executor that is used to decode the token. If None, the default executor of the event loop is used.
+    :param json_codec: Codec that deserializes the claims. See ``decode_auth_token``.
+    :param revocation_store: Optional store of revoked tokens and lab instances. See ``revocation.RevocationStore``.
+    :return: The data that is contained in the token.
+    :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid or revoked. See ``decode_auth_token``.
+    """
+    return await _decode(token, secret_key, algorithms, cache, json_codec, revocation_store, executor)
+
+
+async def verify_auth_token_async(token: str, vmi_name: str, secret_key: str, algorithms: Optional[List[str]] = None,
+                                  cache: Optional[VerifiedTokenCache] = None,
+                                  executor: Optional[Executor] = None,
+                                  json_codec: Optional[JsonCodec] = None,
+                                  revocation_store: Optional["RevocationStore"] = None
+                                  ) -> Tuple[bool, LabInstanceTokenParams]:
+    """Decodes a token without blocking the event loop and verifies if it's valid.
+
+    Works like ``verify_auth_token``. See ``decode_auth_token_async`` for the coalescing of concurrent calls.
+
+    :param token: The token to decode and verify.
+    :param vmi_name: The vmi_name the user wants to use.
+    :param secret_key: Key that is used to decrypt the token.
+    :param algorithms: Allowed algorithms. If None, ['HS256'] is used.
+    :param cache: Optional cache of verified tokens. See ``decode_auth_token``.
+    :param executor: Executor that is used to decode the token. If None, the default executor of the event loop is used.
+    :param json_codec: Codec that deserializes the claims. See ``decode_auth_token``.
+    :param revocation_store: Optional store of revoked tokens and lab instances. See ``revocation.RevocationStore``.
+    :return: The result of the verification as a boolean and the data contained in the token.
+    :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid or revoked. See ``verify_auth_token``.
+    """
+    data = await _decode(token, secret_key, algorithms, cache, json_codec, revocation_store, executor)
+    return data.is_vmi_allowed(vmi_name), data
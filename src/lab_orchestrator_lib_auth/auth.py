@@ -2,24 +2,142 @@
 
 This module contains the authentication methods that are used by the LabOrchestrator.
 """
-from dataclasses import dataclass
-from typing import Optional, Tuple, Union, List, Dict, Any
+import binascii
+import fnmatch
+import json
+import os
+import pickle
+import re
+from dataclasses import dataclass, FrozenInstanceError
+from functools import lru_cache
+from typing import Optional, Tuple, Union, List, Dict, Any, Iterable, Iterator, TYPE_CHECKING
 
-import jwt
 import time
 
+from . import compact as _compact
+from . import metrics as _metrics
+from ._lazy import lazy_import
+from .cache import VerifiedTokenCache, key_fingerprint, token_digest
+from .json_codec import JsonCodec, StdlibJsonCodec
+
+if TYPE_CHECKING:  # pragma: no cover
+    from concurrent.futures import Executor
+    from .revocation import RevocationStore
+
+# PyJWT and cryptography are loaded when the first token is created or decoded, see ``_lazy``.
+jwt = lazy_import('jwt', globals())
+
 
 Identifier = Union[str, int]
+Token = Union[str, bytes, bytearray, memoryview]
+
+_DEFAULT_JSON_CODEC = StdlibJsonCodec()
+
+
+STAGE_STRUCTURE = 'structure'
+STAGE_EXPIRY = 'expiry'
+STAGE_VMI = 'vmi'
+STAGE_SIGNATURE = 'signature'
+STAGE_REVOCATION = 'revocation'
+
+
+def _is_pattern(name: str) -> bool:
+    return '*' in name or '?' in name or '[' in name
+
+
+def _has_wildcards(names: Iterable[str]) -> bool:
+    """Checks if any of the names is a pattern with one substring search per wildcard character."""
+    joined = ''.join(names)
+    return '*' in joined or '?' in joined or '[' in joined
+
+
+def _lab_instance_claim(data: Dict[str, Any]) -> Dict[str, Any]:
+    lab_instance = data.get('lab_instance')
+    if lab_instance is None:
+        lab_instance = _compact.expand_claims(data)
+    return lab_instance
+
+
+class VmiMatcher:
+    """Precompiled set of allowed VM-names.
+
+    Names are looked up in a frozenset. Names that contain one of the wildcard characters ``*``, ``?`` or ``[`` are
+    handled as case-sensitive ``fnmatch`` patterns (e.g. ``worker-*``) and compiled into one regular expression.
+
+    :param allowed_vmi_names: VM-names and patterns that are allowed.
+    """
+    __slots__ = ('names', 'patterns', '_match')
+
+    def __init__(self, allowed_vmi_names: Iterable[str]):
+        if not isinstance(allowed_vmi_names, (list, tuple)):
+            allowed_vmi_names = list(allowed_vmi_names)
+        if _has_wildcards(allowed_vmi_names):
+            self.names = frozenset(name for name in allowed_vmi_names if not _is_pattern(name))
+            patterns = tuple(name for name in allowed_vmi_names if _is_pattern(name))
+        else:
+            self.names = frozenset(allowed_vmi_names)
+            patterns = ()
+        self.patterns = patterns
+        self._match = re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns)).match \
+            if patterns else None
+
+    def __contains__(self, vmi_name: str) -> bool:
+        return vmi_name in self.names or (self._match is not None and self._match(vmi_name) is not None)
+
+    def authorize(self, vmi_names: Iterable[str]) -> Dict[str, bool]:
+        """Checks many VM-names at once.
+
+        :param vmi_names: The VM-names to check.
+        :return: Dictionary that maps every VM-name to True if it's allowed.
+        """
+        return {vmi_name: vmi_name in self for vmi_name in vmi_names}
+
+
+class _VmiAuthorization:
+    """Checks of the allowed VM-names that are shared by all token params classes.
+
+    Most decoded tokens are only checked against one VM-name, so the ``VmiMatcher`` is only built when it's needed: for
+    a pattern, for many VM-names at once or when the params are stored in a cache. Until then a VM-name is looked up
+    with a scan of ``allowed_vmi_names``.
+    """
+    __slots__ = ()
+
+    def _built_vmi_matcher(self) -> Optional[VmiMatcher]:
+        raise NotImplementedError()
+
+    def is_vmi_allowed(self, vmi_name: str) -> bool:
+        """Checks if a VM-name is allowed.
+
+        :param vmi_name: The VM-name the user wants to use.
+        :return: True if the VM-name is allowed.
+        """
+        matcher = self._built_vmi_matcher()
+        if matcher is None:
+            allowed_vmi_names = self.allowed_vmi_names
+            if vmi_name in allowed_vmi_names and not _is_pattern(vmi_name):
+                return True
+            if not _has_wildcards(allowed_vmi_names):
+                return False
+            matcher = self.vmi_matcher
+        return vmi_name in matcher
+
+    def authorize_vmis(self, vmi_names: Iterable[str]) -> Dict[str, bool]:
+        """Checks many VM-names at once.
+
+        :param vmi_names: The VM-names the user wants to use.
+        :return: Dictionary that maps every VM-name to True if it's allowed.
+        """
+        return self.vmi_matcher.authorize(vmi_names)
 
 
 @dataclass
-class LabInstanceTokenParams:
+class LabInstanceTokenParams(_VmiAuthorization):
     """Data that is inserted into the JWT token.
 
     :param lab_id: The id of the lab.
     :param lab_instance_id: The id of the lab instance.
     :param namespace_name: Name of the namespace the VMs are running into.
-    :param allowed_vmi_names: List of VM-names that the user is allowed to access.
+    :param allowed_vmi_names: List of VM-names that the user is allowed to access. Names can be wildcard patterns like ``worker-*``, see ``VmiMatcher``.
     :param additional_data: Additional data that should be added to the key. The data in this parameter needs to be json serializable.
     """
     lab_id: Identifier
@@ -28,11 +146,755 @@ class LabInstanceTokenParams:
     allowed_vmi_names: List[str]
     additional_data: Optional[Dict[str, Any]] = None
 
+    @classmethod
+    def from_claims(cls, data: Dict[str, Any]) -> "LabInstanceTokenParams":
+        """Creates the params from the decoded claims of a token.
+
+        Claims in the compact format are detected and expanded, see ``compact``.
+
+        :param data: The decoded claims of a token.
+        :return: The data that is contained in the token.
+        """
+        lab_instance = _lab_instance_claim(data)
+        params = cls(lab_instance['lab_id'], lab_instance['lab_instance_id'], lab_instance['namespace_name'],
+                     lab_instance['allowed_vmi_names'], lab_instance.get('additional_data', None))
+        jti = data.get('jti')
+        if jti is not None:
+            params.__dict__['_jti'] = jti
+        return params
+
+    @property
+    def jti(self) -> Optional[str]:
+        """The ``jti`` claim of the token the params were decoded from or None. It's not compared by ``==``."""
+        return self.__dict__.get('_jti')
+
+    @property
+    def vmi_matcher(self) -> VmiMatcher:
+        """Matcher of the allowed VM-names. It's built on first use, so ``allowed_vmi_names`` shouldn't be modified afterwards."""
+        matcher = self.__dict__.get('_vmi_matcher')
+        if matcher is None:
+            matcher = self.__dict__['_vmi_matcher'] = VmiMatcher(self.allowed_vmi_names)
+        return matcher
+
+    def _built_vmi_matcher(self) -> Optional[VmiMatcher]:
+        return self.__dict__.get('_vmi_matcher')
+
+    def freeze(self) -> "FrozenLabInstanceTokenParams":
+        """Creates a compact, immutable and hashable copy of the params.
+
+        :return: The frozen params.
+        """
+        return FrozenLabInstanceTokenParams(self.lab_id, self.lab_instance_id, self.namespace_name,
+                                            self.allowed_vmi_names, self.additional_data, self.jti)
+
+
+class FrozenLabInstanceTokenParams(_VmiAuthorization):
+    """Compact, immutable and hashable variant of ``LabInstanceTokenParams``.
+
+    The class uses ``__slots__`` instead of a per-instance ``__dict__`` and only keeps the tuple of the VM-names until a
+    ``VmiMatcher`` is needed, so it's suited for keeping many decoded tokens in memory. It has the same attributes and
+    methods as ``LabInstanceTokenParams``, but ``allowed_vmi_names`` is a tuple. The hash doesn't include
+    ``additional_data``, so the params can be used as dictionary keys. ``additional_data`` shouldn't be modified.
+
+    :param lab_id: The id of the lab.
+    :param lab_instance_id: The id of the lab instance.
+    :param namespace_name: Name of the namespace the VMs are running into.
+    :param allowed_vmi_names: VM-names that the user is allowed to access.
+    :param additional_data: Additional data of the token.
+    :param jti: The ``jti`` claim of the token the params were decoded from. It's not included in the hash and not compared by ``==``.
+    """
+    __slots__ = ('lab_id', 'lab_instance_id', 'namespace_name', 'allowed_vmi_names', 'additional_data', 'jti',
+                 '_vmi_matcher')
+
+    def __init__(self, lab_id: Identifier, lab_instance_id: Identifier, namespace_name: str,
+                 allowed_vmi_names: Iterable[str], additional_data: Optional[Dict[str, Any]] = None,
+                 jti: Optional[str] = None):
+        allowed_vmi_names = tuple(allowed_vmi_names)
+        set_attribute = object.__setattr__
+        set_attribute(self, 'lab_id', lab_id)
+        set_attribute(self, 'lab_instance_id', lab_instance_id)
+        set_attribute(self, 'namespace_name', namespace_name)
+        set_attribute(self, 'allowed_vmi_names', allowed_vmi_names)
+        set_attribute(self, 'additional_data', additional_data)
+        set_attribute(self, 'jti', jti)
+
+    @classmethod
+    def from_claims(cls, data: Dict[str, Any]) -> "FrozenLabInstanceTokenParams":
+        """Creates the params from the decoded claims of a token.
+
+        :param data: The decoded claims of a token in the default or compact format.
+        :return: The data that is contained in the token.
+        """
+        lab_instance = _lab_instance_claim(data)
+        return cls(lab_instance['lab_id'], lab_instance['lab_instance_id'], lab_instance['namespace_name'],
+                   lab_instance['allowed_vmi_names'], lab_instance.get('additional_data', None), data.get('jti'))
+
+    def thaw(self) -> LabInstanceTokenParams:
+        """Creates a mutable ``LabInstanceTokenParams`` copy of the params.
+
+        :return: The mutable params.
+        """
+        params = LabInstanceTokenParams(self.lab_id, self.lab_instance_id, self.namespace_name,
+                                        list(self.allowed_vmi_names), self.additional_data)
+        params.__dict__['_jti'] = self.jti
+        return params
+
+    @property
+    def vmi_matcher(self) -> VmiMatcher:
+        """Matcher of the allowed VM-names. It's built on first use."""
+        try:
+            return self._vmi_matcher
+        except AttributeError:
+            matcher = VmiMatcher(self.allowed_vmi_names)
+            object.__setattr__(self, '_vmi_matcher', matcher)
+            return matcher
+
+    def _built_vmi_matcher(self) -> Optional[VmiMatcher]:
+        try:
+            return self._vmi_matcher
+        except AttributeError:
+            return None
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError("cannot assign to field '%s'" % name)
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError("cannot delete field '%s'" % name)
+
+    def __reduce__(self):
+        return self.__class__, (self.lab_id, self.lab_instance_id, self.namespace_name, self.allowed_vmi_names,
+                                self.additional_data, self.jti)
+
+    def __hash__(self) -> int:
+        return hash((self.lab_id, self.lab_instance_id, self.namespace_name, self.allowed_vmi_names))
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.lab_id == other.lab_id
+                and self.lab_instance_id == other.lab_instance_id and self.namespace_name == other.namespace_name
+                and self.allowed_vmi_names == other.allowed_vmi_names
+                and self.additional_data == other.additional_data)
+
+    def __repr__(self) -> str:
+        return '%s(lab_id=%r, lab_instance_id=%r, namespace_name=%r, allowed_vmi_names=%r, additional_data=%r)' % (
+            self.__class__.__name__, self.lab_id, self.lab_instance_id, self.namespace_name, self.allowed_vmi_names,
+            self.additional_data)
+
+
+@dataclass
+class TokenVerificationResult:
+    """Result of the verification of one token in a batch or of a staged verification.
+
+    :param token: The token that was verified.
+    :param vmi_name: The vmi_name the user wants to use.
+    :param success: True if the token is valid and the vmi_name is allowed in the token.
+    :param params: The data that is contained in the token or None if the token is invalid.
+    :param error: The exception that was raised while decoding the token or None if the token is valid.
+    :param stage: Only set by ``TokenVerifier.verify_staged``: the stage that rejected the token (``structure``, ``expiry``, ``vmi``, ``signature`` or ``revocation``) or None if it was accepted.
+    """
+    token: str
+    vmi_name: str
+    success: bool
+    params: Optional[LabInstanceTokenParams]
+    error: Optional[Exception] = None
+    stage: Optional[str] = None
+
+
+class TokenIssuer:
+    """Creates JWT tokens with a key and algorithm that are prepared once.
+
+    The key is parsed and the algorithm and the encoded header are resolved when the issuer is created, so creating a
+    token only needs to encode the payload and sign it. This is mostly useful for RS256/ES256 keys, where parsing the
+    PEM key is expensive.
+
+    An issuer can be pickled if ``secret_key`` is a string or bytes.
+
+    :param secret_key: The secret key that is used to sign the tokens.
+    :param algorithm: Algorithm that should be used for creating the tokens. Available algorithms: https://pyjwt.readthedocs.io/en/latest/algorithms.html
+    :param expires_in: Default amount of seconds a token is valid.
+    :param json_codec: Codec that serializes the claims. If None, the stdlib ``json`` module is used. See ``json_codec.get_json_codec``.
+    :param kid: Optional key id that is added as ``kid`` header, so verifiers can select the key. See ``keyring.KeyRing``.
+    :param compact: If True, the tokens use the compact claim format with short keys. See ``compact``.
+    :param compress: If True, the compact claims are also deflate compressed. Implies compact.
+    :param issue_jti: If True, every token gets a random ``jti`` claim, so it can be revoked. See ``revocation.RevocationStore``.
+    :raise NotImplementedError: Raised when the algorithm is not supported.
+    :raise jwt.exceptions.InvalidKeyError: Raised when the specified key is not in the proper format.
+    """
+
+    def __init__(self, secret_key: Any, algorithm: str = 'HS256', expires_in: int = 60 * 60,
+                 json_codec: Optional[JsonCodec] = None, kid: Optional[str] = None, compact: bool = False,
+                 compress: bool = False, issue_jti: bool = False):
+        self._secret_key = secret_key
+        self.algorithm = algorithm
+        self.expires_in = expires_in
+        self.json_codec = _DEFAULT_JSON_CODEC if json_codec is None else json_codec
+        self.kid = kid
+        self.compact = compact or compress
+        self.compress = compress
+        self.issue_jti = issue_jti
+        try:
+            self._alg_obj = jwt.algorithms.get_default_algorithms()[algorithm]
+        except KeyError:
+            if not jwt.algorithms.has_crypto and algorithm in jwt.algorithms.requires_cryptography:
+                raise NotImplementedError(
+                    "Algorithm '%s' could not be found. Do you have cryptography installed?" % algorithm
+                )
+            raise NotImplementedError("Algorithm not supported")
+        self._key = self._alg_obj.prepare_key(secret_key)
+        header = {'typ': 'JWT', 'alg': algorithm}
+        if kid is not None:
+            header['kid'] = kid
+        self._header_segment = jwt.utils.base64url_encode(json.dumps(header, separators=(',', ':')).encode('utf-8'))
+
+    def __getstate__(self):
+        return {'secret_key': self._secret_key, 'algorithm': self.algorithm, 'expires_in': self.expires_in,
+                'json_codec': self.json_codec, 'kid': self.kid, 'compact': self.compact, 'compress': self.compress,
+                'issue_jti': self.issue_jti}
+
+    def __setstate__(self, state):
+        self.__init__(state['secret_key'], state['algorithm'], state['expires_in'], state['json_codec'], state['kid'],
+                      state['compact'], state['compress'], state['issue_jti'])
+
+    def encode_claims(self, claims: Dict[str, Any]) -> str:
+        """Signs arbitrary claims with the prepared key.
+
+        :param claims: The json serializable claims of the token.
+        :return: A JWT token.
+        """
+        payload = self.json_codec.dumps(claims)
+        signing_input = self._header_segment + b'.' + jwt.utils.base64url_encode(payload)
+        signature = self._alg_obj.sign(signing_input, self._key)
+        return (signing_input + b'.' + jwt.utils.base64url_encode(signature)).decode('utf-8')
+
+    def generate(self, user_id: Identifier, lab_instance_token_params: LabInstanceTokenParams,
+                 expires_in: Optional[int] = None, expires_at: Optional[int] = None) -> str:
+        """Generates a JWT token.
+
+        :param user_id: Id of the user.
+        :param lab_instance_token_params: The data that is included in the token.
+        :param expires_in: Amount of seconds the token is valid. If None, the default of the issuer is used.
+        :param expires_at: Optional UNIX time at which this token expires. Overwrites expires_in.
+        :return: A JWT token.
+        """
+        sink = _metrics._sink
+        if sink is not None:
+            return _metrics.instrument(sink, 'generate', self._generate, user_id, lab_instance_token_params,
+                                       expires_in, expires_at)
+        return self._generate(user_id, lab_instance_token_params, expires_in, expires_at)
+
+    def _generate(self, user_id: Identifier, lab_instance_token_params: LabInstanceTokenParams,
+                  expires_in: Optional[int], expires_at: Optional[int]) -> str:
+        if not expires_at:
+            expires_at = time.time() + (self.expires_in if expires_in is None else expires_in)
+
+        claims = {'id': user_id, 'exp': expires_at}
+        if self.issue_jti:
+            claims['jti'] = jwt.utils.base64url_encode(os.urandom(16)).decode('ascii')
+        if self.compact:
+            claims.update(_compact.compact_claims(
+                lab_instance_token_params.lab_id, lab_instance_token_params.lab_instance_id,
+                lab_instance_token_params.namespace_name, lab_instance_token_params.allowed_vmi_names,
+                lab_instance_token_params.additional_data, self.compress))
+        else:
+            claims['lab_instance'] = {
+                'lab_id': lab_instance_token_params.lab_id,
+                'lab_instance_id': lab_instance_token_params.lab_instance_id,
+                'namespace_name': lab_instance_token_params.namespace_name,
+                'allowed_vmi_names': lab_instance_token_params.allowed_vmi_names,
+                'additional_data': lab_instance_token_params.additional_data,
+            }
+        return self.encode_claims(claims)
+
+    def generate_batch(self, items: Iterable[Tuple[Identifier, LabInstanceTokenParams]],
+                       expires_in: Optional[int] = None, expires_at: Optional[int] = None,
+                       executor: Optional["Executor"] = None, chunksize: int = 64) -> List[str]:
+        """Generates many JWT tokens that expire at the same time.
+
+        :param items: Iterable of (user_id, lab_instance_token_params) pairs.
+        :param expires_in: Amount of seconds the tokens are valid. If None, the default of the issuer is used.
+        :param expires_at: Optional UNIX time at which the tokens expire. Overwrites expires_in.
+        :param executor: Optional thread or process pool that signs the tokens in chunks. Useful for RS/ES algorithms. A process pool needs a string or bytes key. Every worker process prepares the key once and reuses it for all chunks.
+        :param chunksize: Amount of tokens that are sent to the executor at once.
+        :return: The tokens in the order of the items.
+        """
+        if not expires_at:
+            expires_at = time.time() + (self.expires_in if expires_in is None else expires_in)
+        items = list(items)
+        if executor is None:
+            return [self.generate(user_id, params, expires_at=expires_at) for user_id, params in items]
+        if chunksize <= 0:
+            raise ValueError("chunksize needs to be greater than 0")
+        chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+        issuer = _IssuerReference(issuer=self)
+        tokens: List[str] = []
+        for chunk_tokens in executor.map(_generate_chunk, [issuer] * len(chunks), chunks, [expires_at] * len(chunks)):
+            tokens.extend(chunk_tokens)
+        return tokens
+
+
+# issuers of the worker processes by their pickled state, so the key is only prepared once per worker
+_worker_issuers: Dict[bytes, TokenIssuer] = {}
+_MAX_WORKER_ISSUERS = 16
+
+
+class _IssuerReference:
+    """Reference to an issuer that is sent to an executor.
+
+    Only the pickled state of the issuer is sent to worker processes. A worker creates the issuer from the state once
+    and reuses it for later chunks. In the process of the issuer, e.g. in a thread pool, the issuer itself is used, so
+    the state is only pickled when the reference is sent to another process.
+    """
+    __slots__ = ('state', 'issuer')
+
+    def __init__(self, state: Optional[bytes] = None, issuer: Optional[TokenIssuer] = None):
+        self.state = state
+        self.issuer = issuer
+
+    def __reduce__(self):
+        state = self.state
+        if state is None:
+            state = self.state = pickle.dumps(self.issuer)
+        return _IssuerReference, (state,)
+
+    def get(self) -> TokenIssuer:
+        issuer = self.issuer
+        if issuer is None:
+            issuer = _worker_issuers.get(self.state)
+            if issuer is None:
+                if len(_worker_issuers) >= _MAX_WORKER_ISSUERS:
+                    _worker_issuers.clear()
+                issuer = _worker_issuers[self.state] = pickle.loads(self.state)
+            self.issuer = issuer
+        return issuer
+
+
+def _generate_chunk(issuer: _IssuerReference, items: List[Tuple[Identifier, LabInstanceTokenParams]],
+                    expires_at: float) -> List[str]:
+    issuer = issuer.get()
+    return [issuer.generate(user_id, params, expires_at=expires_at) for user_id, params in items]
+
+
+class TokenVerifier:
+    """Decodes and verifies JWT tokens with a key and algorithms that are prepared once.
+
+    The key is parsed and the list of allowed algorithms is built when the verifier is created, so a long-lived
+    verifier only needs to check the signature and the claims of each token. ``decode_auth_token`` and
+    ``verify_auth_token`` are thin wrappers around this class.
+
+    A verifier can be pickled if ``secret_key`` is a string or bytes and its cache and revocation store can be pickled.
+    ``cache.VerifiedTokenCache`` and ``revocation.RevocationStore`` belong to one process and can't be pickled, a
+    ``shared_cache.SharedTokenCache`` can.
+
+    :param secret_key: Key that should be used to decrypt the tokens.
+    :param algorithms: Allowed algorithms. If None, ['HS256'] is used.
+    :param cache: Optional cache of verified tokens. On a hit the cached data is returned without decoding the token again.
+    :param params_class: Class of the returned data. Use ``FrozenLabInstanceTokenParams`` for a compact and hashable representation.
+    :param json_codec: Codec that deserializes the claims. If None, PyJWT decodes the claims with the stdlib ``json`` module. See ``json_codec.get_json_codec``.
+    :param revocation_store: Optional store of revoked tokens. Revoked tokens raise a ``revocation.TokenRevokedError``, also on cache hits.
+    """
+
+    def __init__(self, secret_key: Any, algorithms: Optional[List[str]] = None,
+                 cache: Optional[VerifiedTokenCache] = None,
+                 params_class: type = LabInstanceTokenParams,
+                 json_codec: Optional[JsonCodec] = None,
+                 revocation_store: Optional["RevocationStore"] = None):
+        if algorithms is None:
+            algorithms = ['HS256']
+        self._secret_key = secret_key
+        self.algorithms = list(algorithms)
+        self.cache = cache
+        self.params_class = params_class
+        self.json_codec = json_codec
+        self.revocation_store = revocation_store
+        self._jwt = None if json_codec is None else _CodecPyJWT(json_codec)
+        self._key = self._prepare_key(secret_key, self.algorithms)
+        self._key_suffix = None
+        self._cache_key_suffix = None if cache is None else self._make_cache_key_suffix()
+
+    def __getstate__(self):
+        return {'secret_key': self._secret_key, 'algorithms': self.algorithms, 'cache': self.cache,
+                'params_class': self.params_class, 'json_codec': self.json_codec,
+                'revocation_store': self.revocation_store}
+
+    def __setstate__(self, state):
+        self.__init__(state['secret_key'], state['algorithms'], state['cache'], state['params_class'],
+                      state['json_codec'], state['revocation_store'])
+
+    def _make_cache_key_suffix(self) -> Tuple[Any, ...]:
+        """Identifies the key, the algorithms and the params class in cache keys. The key fingerprint is calculated once."""
+        suffix = self._key_suffix
+        if suffix is None:
+            suffix = (key_fingerprint(self._secret_key), tuple(self.algorithms))
+            if self.params_class is not LabInstanceTokenParams:
+                suffix += (self.params_class,)
+            self._key_suffix = suffix
+        return suffix
+
+    def _with_options(self, cache: Optional[VerifiedTokenCache],
+                      revocation_store: Optional["RevocationStore"]) -> "TokenVerifier":
+        """Returns a verifier that shares the prepared key of this verifier but uses another cache and revocation store."""
+        verifier = object.__new__(self.__class__)
+        verifier.__dict__.update(self.__dict__)
+        verifier.cache = cache
+        verifier.revocation_store = revocation_store
+        verifier._cache_key_suffix = None if cache is None else self._make_cache_key_suffix()
+        return verifier
+
+    @staticmethod
+    def _prepare_key(secret_key: Any, algorithms: List[str]) -> Any:
+        """Parses the key once for all allowed algorithms.
+
+        The prepared key is only used if every allowed algorithm accepts it. Otherwise the raw key is kept, so PyJWT
+        reports key errors for the algorithm of the token while decoding like before.
+        """
+        available = jwt.algorithms.get_default_algorithms()
+        alg_objs = [available[alg] for alg in algorithms if alg in available]
+        if not alg_objs:
+            return secret_key
+        try:
+            prepared = alg_objs[0].prepare_key(secret_key)
+            for alg_obj in alg_objs[1:]:
+                alg_obj.prepare_key(prepared)
+        except Exception:
+            return secret_key
+        return prepared
+
+    def decode_claims(self, token: Token) -> Dict[str, Any]:
+        """Decodes a JWT token and returns all of its claims. The cache is not used.
+
+        :param token: The token to decode. Bytes and memoryviews, e.g. from a websocket frame, are decoded without converting them to a string.
+        :return: The verified claims of the token.
+        :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid. See ``decode_auth_token``.
+        """
+        if token.__class__ is not str and token.__class__ is not bytes:
+            token = _normalize_token(token)
+        if self._jwt is None:
+            return jwt.decode(token, self._key, algorithms=self.algorithms)
+        return self._jwt.decode(token, self._key, algorithms=self.algorithms)
+
+    def decode(self, token: Token) -> LabInstanceTokenParams:
+        """Decodes a JWT token.
+
+        :param token: The token to decode. Bytes and memoryviews, e.g. from a websocket frame, are decoded without converting them to a string.
+        :return: The data that is contained in the token.
+        :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid. See ``decode_auth_token``.
+        """
+        sink = _metrics._sink
+        if sink is not None:
+            return _metrics.instrument(sink, 'decode', self._decode, token)
+        return self._decode(token)
+
+    def _decode(self, token: Token) -> LabInstanceTokenParams:
+        if token.__class__ is not str and token.__class__ is not bytes:
+            token = _normalize_token(token)
+        cache = self.cache
+        if cache is not None:
+            cache_key = (token_digest(token),) + self._cache_key_suffix
+            cached = cache.get(cache_key)
+            sink = _metrics._sink
+            if sink is not None:
+                sink.count_cache('miss' if cached is None else 'hit')
+            if cached is not None:
+                if self.revocation_store is not None:
+                    self.revocation_store.check(cached)
+                return cached
+        data = self.decode_claims(token)
+        params = self.params_class.from_claims(data)
+        if cache is not None:
+            cache.put(cache_key, params, data.get('exp'))
+        if self.revocation_store is not None:
+            self.revocation_store.check(params)
+        return params
+
+    def verify(self, token: Token, vmi_name: str) -> Tuple[bool, LabInstanceTokenParams]:
+        """Decodes a token and checks if the vmi_name is allowed in the token.
+
+        :param token: The token to decode and verify.
+        :param vmi_name: The vmi_name the user wants to use.
+        :return: The result of the verification as a boolean and the data contained in the token.
+        :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid. See ``verify_auth_token``.
+        """
+        sink = _metrics._sink
+        if sink is not None:
+            return _metrics.instrument(sink, 'verify', self._verify, token, vmi_name)
+        return self._verify(token, vmi_name)
+
+    def _verify(self, token: Token, vmi_name: str) -> Tuple[bool, LabInstanceTokenParams]:
+        data = self._decode(token)
+        return data.is_vmi_allowed(vmi_name), data
+
+    def authorize(self, token: Token, vmi_names: Iterable[str]) -> Tuple[Dict[str, bool], LabInstanceTokenParams]:
+        """Decodes a token and checks many VM-names at once.
+
+        :param token: The token to decode and verify.
+        :param vmi_names: The VM-names the user wants to use.
+        :return: Dictionary that maps every VM-name to True if it's allowed and the data contained in the token.
+        :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid. See ``verify_auth_token``.
+        """
+        data = self.decode(token)
+        return data.authorize_vmis(vmi_names), data
+
+    def verify_batch(self, pairs: Iterable[Tuple[Token, str]]) -> Iterator[TokenVerificationResult]:
+        """Verifies many tokens and streams back one result per pair.
+
+        Invalid tokens, also values that aren't tokens, don't raise an exception, the exception is returned in the
+        result instead. Every unique token is only decoded once per batch. PyJWT parses the header, payload and signature segments of a token in the same pass
+        that checks the signature, so a token isn't parsed again after it was decoded. Every pair is reported as a
+        ``verify`` operation to the metrics sink.
+
+        :param pairs: Iterable of (token, vmi_name) pairs.
+        :return: Iterator of results in the order of the pairs.
+        """
+        decoded: Dict[str, Tuple[Optional[LabInstanceTokenParams], Optional[Exception]]] = {}
+        sink = _metrics._sink
+        for token, vmi_name in pairs:
+            if sink is not None:
+                start = time.perf_counter()
+            try:
+                if token.__class__ is not str and token.__class__ is not bytes:
+                    token = _normalize_token(token)
+                entry = decoded.get(token)
+                if entry is None:
+                    try:
+                        entry = (self._decode(token), None)
+                    except (jwt.exceptions.PyJWTError, KeyError, TypeError) as e:
+                        entry = (None, e)
+                    decoded[token] = entry
+            except jwt.exceptions.DecodeError as e:
+                entry = (None, e)
+            params, error = entry
+            success = False
+            if params is not None:
+                try:
+                    success = params.is_vmi_allowed(vmi_name)
+                except (TypeError, AttributeError) as e:
+                    error = e
+            if sink is not None:
+                sink.observe('verify', time.perf_counter() - start, _metrics.verification_outcome(success, error))
+            yield TokenVerificationResult(token, vmi_name, success, params, error)
+
+    def verify_staged(self, token: Token, vmi_name: str) -> TokenVerificationResult:
+        """Verifies a token in stages and checks the signature last.
+
+        Cached tokens are only checked against the vmi_name. Otherwise the structure of the token, the ``exp`` claim and
+        the exact membership of the vmi_name in the raw list of allowed VM-names are checked on the unverified payload
+        first, so malformed, expired and forbidden tokens are rejected without signature work. Lists with wildcard
+        patterns and compressed claims skip the VM-name check before the signature. The params are only built from
+        verified claims, so a token is only accepted after the signature and all claims are verified like in
+        ``verify``. Tokens that are rejected before the signature stage aren't authenticated, so their result contains
+        no params and the stage only tells which check failed first. Invalid tokens don't raise an exception.
+
+        :param token: The token to verify.
+        :param vmi_name: The vmi_name the user wants to use.
+        :return: The result with the rejecting stage or None as stage if the token was accepted.
+        """
+        sink = _metrics._sink
+        if sink is None:
+            return self._verify_staged(token, vmi_name)
+        start = time.perf_counter()
+        result = self._verify_staged(token, vmi_name)
+        sink.observe('verify', time.perf_counter() - start, _metrics.verification_outcome(result.success, result.error))
+        return result
+
+    def _verify_staged(self, token: Token, vmi_name: str) -> TokenVerificationResult:
+        try:
+            if token.__class__ is not str and token.__class__ is not bytes:
+                token = _normalize_token(token)
+        except jwt.exceptions.DecodeError as e:
+            return TokenVerificationResult(token, vmi_name, False, None, e, STAGE_STRUCTURE)
+        cache = self.cache
+        if cache is not None:
+            cache_key = (token_digest(token),) + self._cache_key_suffix
+            params = cache.get(cache_key)
+            if params is not None:
+                return self._finish_staged(token, vmi_name, params)
+
+        try:
+            payload = _load_unverified_payload(token, self.algorithms, self.json_codec)
+            _check_unverified_structure(payload)
+        except (jwt.exceptions.PyJWTError, KeyError) as e:
+            return TokenVerificationResult(token, vmi_name, False, None, e, STAGE_STRUCTURE)
+        if 'exp' in payload:
+            try:
+                expired = int(payload['exp']) < int(time.time())
+            except (TypeError, ValueError, OverflowError):
+                error = jwt.exceptions.DecodeError("Expiration Time claim (exp) must be an integer.")
+                return TokenVerificationResult(token, vmi_name, False, None, error, STAGE_EXPIRY)
+            if expired:
+                error = jwt.exceptions.ExpiredSignatureError("Signature has expired")
+                return TokenVerificationResult(token, vmi_name, False, None, error, STAGE_EXPIRY)
+        if _unverified_vmi_allowed(payload, vmi_name) is False:
+            return TokenVerificationResult(token, vmi_name, False, None, None, STAGE_VMI)
+
+        try:
+            jwt.api_jws.decode_complete(token, key=self._key, algorithms=self.algorithms)
+            validator = _claims_validator()
+            validator._validate_claims(payload, validator.options)
+        except jwt.exceptions.PyJWTError as e:
+            return TokenVerificationResult(token, vmi_name, False, None, e, STAGE_SIGNATURE)
+        try:
+            params = self.params_class.from_claims(payload)
+        except (jwt.exceptions.PyJWTError, KeyError, TypeError, AttributeError) as e:
+            return TokenVerificationResult(token, vmi_name, False, None, e, STAGE_STRUCTURE)
+        if cache is not None:
+            cache.put(cache_key, params, payload.get('exp'))
+        return self._finish_staged(token, vmi_name, params)
+
+    def _finish_staged(self, token: Union[str, bytes], vmi_name: str,
+                       params: LabInstanceTokenParams) -> TokenVerificationResult:
+        if self.revocation_store is not None:
+            try:
+                self.revocation_store.check(params)
+            except jwt.exceptions.InvalidTokenError as e:
+                return TokenVerificationResult(token, vmi_name, False, params, e, STAGE_REVOCATION)
+        if not params.is_vmi_allowed(vmi_name):
+            return TokenVerificationResult(token, vmi_name, False, params, None, STAGE_VMI)
+        return TokenVerificationResult(token, vmi_name, True, params)
+
+
+def _normalize_token(token: Token) -> Union[str, bytes]:
+    if isinstance(token, (str, bytes)):
+        return token
+    if isinstance(token, (bytearray, memoryview)):
+        return bytes(token)
+    raise jwt.exceptions.DecodeError("Invalid token type. Token must be a str, bytes or memoryview")
+
+
+class _CodecPyJWT:
+    """Decodes tokens like ``jwt.decode`` but deserializes the claims with a custom json codec.
+
+    It wraps a ``jwt.PyJWT`` instead of subclassing it, so PyJWT isn't loaded when this module is imported.
+    """
+
+    def __init__(self, json_codec: JsonCodec):
+        self.json_codec = json_codec
+        self._pyjwt = jwt.PyJWT()
+
+    def decode(self, token: Union[str, bytes], key: Any = "", algorithms: Optional[List[str]] = None,
+               options: Optional[Dict] = None, **kwargs) -> Dict[str, Any]:
+        decoded = jwt.api_jws.decode_complete(token, key=key, algorithms=algorithms, options=options)
+        try:
+            payload = self.json_codec.loads(decoded['payload'])
+        except ValueError as e:
+            raise jwt.exceptions.DecodeError("Invalid payload string: %s" % e)
+        if not isinstance(payload, dict):
+            raise jwt.exceptions.DecodeError("Invalid payload string: must be a json object")
+        self._pyjwt._validate_claims(payload, {**self._pyjwt.options, **(options or {})}, **kwargs)
+        return payload
+
+
+def _check_unverified_structure(payload: Dict[str, Any]) -> None:
+    """Checks that an unverified payload contains a lab instance in one of the formats without building the params."""
+    if isinstance(payload.get('lab_instance'), dict) or isinstance(payload.get(_compact.COMPACT_CLAIM), dict) \
+            or _compact.COMPRESSED_CLAIM in payload:
+        return
+    raise KeyError('lab_instance')
+
+
+def _unverified_vmi_allowed(payload: Dict[str, Any], vmi_name: str) -> Optional[bool]:
+    """Checks the exact membership of the vmi_name in the raw list of allowed VM-names of an unverified payload.
+
+    Returns None if it can't be decided without building the params, i.e. for compressed claims, wildcard patterns and
+    values of unexpected types. Those tokens are checked after the signature.
+    """
+    lab_instance = payload.get('lab_instance')
+    if isinstance(lab_instance, dict):
+        names = lab_instance.get('allowed_vmi_names')
+    else:
+        lab_instance = payload.get(_compact.COMPACT_CLAIM)
+        if not isinstance(lab_instance, dict):
+            return None
+        names = lab_instance.get('v')
+        namespace_name = lab_instance.get('n')
+        if not isinstance(names, list) or not isinstance(namespace_name, str) \
+                or not all(name.__class__ is str for name in names):
+            return None
+        names = _compact.decode_vmi_names(namespace_name, names)
+    if not isinstance(names, list) or not all(name.__class__ is str for name in names) or _has_wildcards(names):
+        return None
+    return vmi_name in names
+
+
+def _load_unverified_payload(token: Union[str, bytes], algorithms: List[str],
+                             json_codec: Optional[JsonCodec]) -> Dict[str, Any]:
+    """Checks the structure and the algorithm of a token like PyJWT and returns its payload without verifying it."""
+    if isinstance(token, str):
+        token = token.encode('utf-8')
+    try:
+        signing_input, crypto_segment = token.rsplit(b'.', 1)
+        header_segment, payload_segment = signing_input.split(b'.', 1)
+    except ValueError as e:
+        raise jwt.exceptions.DecodeError("Not enough segments") from e
+    try:
+        header = json.loads(jwt.utils.base64url_decode(header_segment))
+        payload_data = jwt.utils.base64url_decode(payload_segment)
+        jwt.utils.base64url_decode(crypto_segment)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise jwt.exceptions.DecodeError("Invalid token: %s" % e) from e
+    if not isinstance(header, dict):
+        raise jwt.exceptions.DecodeError("Invalid header string: must be a json object")
+    if header.get('alg') not in algorithms:
+        raise jwt.exceptions.InvalidAlgorithmError("The specified alg value is not allowed")
+    try:
+        payload = (_DEFAULT_JSON_CODEC if json_codec is None else json_codec).loads(payload_data)
+    except ValueError as e:
+        raise jwt.exceptions.DecodeError("Invalid payload string: %s" % e) from e
+    if not isinstance(payload, dict):
+        raise jwt.exceptions.DecodeError("Invalid payload string: must be a json object")
+    return payload
+
+
+@lru_cache(maxsize=1)
+def _claims_validator() -> Any:
+    return jwt.PyJWT()
+
+
+@lru_cache(maxsize=16)
+def _shared_issuer(secret_key: Union[str, bytes], algorithm: str, json_codec: Optional[JsonCodec],
+                   kid: Optional[str], compact: bool, compress: bool, issue_jti: bool) -> TokenIssuer:
+    return TokenIssuer(secret_key, algorithm, json_codec=json_codec, kid=kid, compact=compact, compress=compress,
+                       issue_jti=issue_jti)
+
+
+@lru_cache(maxsize=16)
+def _shared_verifier(secret_key: Union[str, bytes], algorithms: Optional[Tuple[str, ...]],
+                     json_codec: Optional[JsonCodec]) -> TokenVerifier:
+    return TokenVerifier(secret_key, None if algorithms is None else list(algorithms), json_codec=json_codec)
+
+
+def _get_issuer(secret_key: Any, algorithm: str, json_codec: Optional[JsonCodec] = None,
+                kid: Optional[str] = None, compact: bool = False, compress: bool = False,
+                issue_jti: bool = False) -> TokenIssuer:
+    if isinstance(secret_key, (str, bytes)):
+        return _shared_issuer(secret_key, algorithm, json_codec, kid, compact, compress, issue_jti)
+    return TokenIssuer(secret_key, algorithm, json_codec=json_codec, kid=kid, compact=compact, compress=compress,
+                       issue_jti=issue_jti)
+
+
+def _get_verifier(secret_key: Any, algorithms: Optional[List[str]], cache: Optional[VerifiedTokenCache],
+                  json_codec: Optional[JsonCodec] = None,
+                  revocation_store: Optional["RevocationStore"] = None) -> TokenVerifier:
+    if isinstance(secret_key, (str, bytes)):
+        verifier = _shared_verifier(secret_key, None if algorithms is None else tuple(algorithms), json_codec)
+        if cache is None and revocation_store is None:
+            return verifier
+        return verifier._with_options(cache, revocation_store)
+    return TokenVerifier(secret_key, algorithms, cache=cache, json_codec=json_codec,
+                         revocation_store=revocation_store)
+
 
 def generate_auth_token(user_id: Identifier, lab_instance_token_params: LabInstanceTokenParams,
                         secret_key: str, expires_in: int = 60 * 60,
                         expires_at: Optional[int] = None,
-                        algorithm: str = 'HS256'
+                        algorithm: str = 'HS256',
+                        json_codec: Optional[JsonCodec] = None,
+                        kid: Optional[str] = None,
+                        compact: bool = False,
+                        compress: bool = False,
+                        issue_jti: bool = False
                         ) -> str:
     """Generates a JWT token.
 
@@ -42,29 +904,57 @@ def generate_auth_token(user_id: Identifier, lab_instance_token_params: LabInsta
     :param expires_in: Amount of seconds the token is valid.
     :param expires_at: Optional UNIX time at which this token expires. Overwrites expires_in.
     :param algorithm: Algorithm that should be used for creating the token. Available algorithms: https://pyjwt.readthedocs.io/en/latest/algorithms.html
+    :param json_codec: Codec that serializes the claims. If None, the stdlib ``json`` module is used. See ``json_codec.get_json_codec``.
+    :param kid: Optional key id that is added as ``kid`` header. See ``keyring.KeyRing``.
+    :param compact: If True, the token uses the compact claim format, which is much smaller for many VM-names. See ``compact``.
+    :param compress: If True, the compact claims are also deflate compressed. Implies compact.
+    :param issue_jti: If True, the token gets a random ``jti`` claim, so it can be revoked. See ``revocation.RevocationStore``.
     :return: A JWT token.
     """
-    if not expires_at:
-        expires_at = time.time() + expires_in
+    return _get_issuer(secret_key, algorithm, json_codec, kid, compact, compress, issue_jti).generate(
+        user_id, lab_instance_token_params, expires_in=expires_in, expires_at=expires_at)
+
+
+def generate_auth_tokens_batch(items: Iterable[Tuple[Identifier, LabInstanceTokenParams]], secret_key: str,
+                               expires_in: int = 60 * 60, expires_at: Optional[int] = None,
+                               algorithm: str = 'HS256', json_codec: Optional[JsonCodec] = None,
+                               executor: Optional["Executor"] = None, compact: bool = False,
+                               compress: bool = False, issue_jti: bool = False,
+                               kid: Optional[str] = None) -> List[str]:
+    """Generates many JWT tokens, e.g. for every student and lab instance of a class.
+
+    The key, algorithm and header are prepared once for all tokens, and all tokens expire at the same time.
 
-    return jwt.encode({
-        'id': user_id,
-        'exp': expires_at,
-        'lab_instance': {
-            'lab_id': lab_instance_token_params.lab_id,
-            'lab_instance_id': lab_instance_token_params.lab_instance_id,
-            'namespace_name': lab_instance_token_params.namespace_name,
-            'allowed_vmi_names': lab_instance_token_params.allowed_vmi_names,
-            'additional_data': lab_instance_token_params.additional_data,
-        }}, secret_key, algorithm=algorithm)
+    :param items: Iterable of (user_id, lab_instance_token_params) pairs.
+    :param secret_key: The secret key that is used to sign the tokens.
+    :param expires_in: Amount of seconds the tokens are valid.
+    :param expires_at: Optional UNIX time at which the tokens expire. Overwrites expires_in.
+    :param algorithm: Algorithm that should be used for creating the tokens. Available algorithms: https://pyjwt.readthedocs.io/en/latest/algorithms.html
+    :param json_codec: Codec that serializes the claims. If None, the stdlib ``json`` module is used. See ``json_codec.get_json_codec``.
+    :param executor: Optional thread or process pool that signs the tokens. Useful for RS/ES algorithms. A process pool needs a string or bytes key.
+    :param compact: If True, the tokens use the compact claim format. See ``compact``.
+    :param compress: If True, the compact claims are also deflate compressed. Implies compact.
+    :param issue_jti: If True, every token gets a random ``jti`` claim, so it can be revoked.
+    :param kid: Optional key id that is added as ``kid`` header. See ``keyring.KeyRing``.
+    :return: The tokens in the order of the items.
+    """
+    return _get_issuer(secret_key, algorithm, json_codec, kid=kid, compact=compact, compress=compress,
+                       issue_jti=issue_jti).generate_batch(items, expires_in=expires_in, expires_at=expires_at,
+                                                           executor=executor)
 
 
-def decode_auth_token(token: str, secret_key: str, algorithms: Optional[List[str]] = None) -> LabInstanceTokenParams:
+def decode_auth_token(token: Token, secret_key: str, algorithms: Optional[List[str]] = None,
+                      cache: Optional[VerifiedTokenCache] = None,
+                      json_codec: Optional[JsonCodec] = None,
+                      revocation_store: Optional["RevocationStore"] = None) -> LabInstanceTokenParams:
     """Decodes a JWT token.
 
-    :param token: The token to decode.
+    :param token: The token to decode. Bytes and memoryviews, e.g. from a websocket frame, are decoded without converting them to a string.
     :param secret_key: Key that should be used to decrypt the token.
     :param algorithms: Allowed algorithms. If None, ['HS256'] is used.
+    :param cache: Optional cache of verified tokens. On a hit the cached data is returned without decoding the token again.
+    :param json_codec: Codec that deserializes the claims. If None, the stdlib ``json`` module is used. See ``json_codec.get_json_codec``.
+    :param revocation_store: Optional store of revoked tokens and lab instances. See ``revocation.RevocationStore``.
     :return: The data that is contained in the token or None if decode goes wrong.
     :raise jwt.exceptions.DecodeError: Raised when a token cannot be decoded because it failed validation.
     :raise jwt.exceptions.InvalidSignatureError: Raised when a token’s signature doesn’t match the one provided as part of the token.
@@ -76,20 +966,15 @@ def decode_auth_token(token: str, secret_key: str, algorithms: Optional[List[str
     :raise jwt.exceptions.InvalidKeyError: Raised when the specified key is not in the proper format.
     :raise jwt.exceptions.InvalidAlgorithmError: Raised when the specified algorithm is not recognized by PyJWT.
     :raise jwt.exceptions.MissingRequiredClaimError: Raised when a claim that is required to be present is not contained in the claimset.
+    :raise revocation.TokenRevokedError: Raised when the token or its lab instance is revoked in the revocation store.
     """
-    if algorithms is None:
-        algorithms = ['HS256']
-    data = jwt.decode(token, secret_key, algorithms=algorithms)
-    return LabInstanceTokenParams(
-        lab_id=data['lab_instance']['lab_id'],
-        lab_instance_id=data['lab_instance']['lab_instance_id'],
-        namespace_name=data['lab_instance']['namespace_name'],
-        allowed_vmi_names=data['lab_instance']['allowed_vmi_names'],
-        additional_data=data['lab_instance'].get('additional_data', None),
-    )
+    return _get_verifier(secret_key, algorithms, cache, json_codec, revocation_store).decode(token)
 
 
-def verify_auth_token(token: str, vmi_name: str, secret_key: str, algorithms: Optional[List[str]] = None) -> Tuple[bool, LabInstanceTokenParams]:
+def verify_auth_token(token: Token, vmi_name: str, secret_key: str, algorithms: Optional[List[str]] = None,
+                      cache: Optional[VerifiedTokenCache] = None,
+                      json_codec: Optional[JsonCodec] = None,
+                      revocation_store: Optional["RevocationStore"] = None) -> Tuple[bool, LabInstanceTokenParams]:
     """Decodes a token and verifies if it's valid.
 
     Checks if the vmi_name is allowed in the token.
@@ -97,6 +982,10 @@ def verify_auth_token(token: str, vmi_name: str, secret_key: str, algorithms: Op
     :param token: The token to decode and verify.
     :param vmi_name: The vmi_name the user wants to use.
     :param secret_key: Key that is used to decrypt the token.
+    :param algorithms: Allowed algorithms. If None, ['HS256'] is used.
+    :param cache: Optional cache of verified tokens. See ``decode_auth_token``.
+    :param json_codec: Codec that deserializes the claims. See ``decode_auth_token``.
+    :param revocation_store: Optional store of revoked tokens and lab instances. See ``revocation.RevocationStore``.
     :return: The result of the verification as a boolean and the data contained in the token.
     :raise jwt.exceptions.DecodeError: Raised when a token cannot be decoded because it failed validation.
     :raise jwt.exceptions.InvalidSignatureError: Raised when a token’s signature doesn’t match the one provided as part of the token.
@@ -108,9 +997,70 @@ def verify_auth_token(token: str, vmi_name: str, secret_key: str, algorithms: Op
     :raise jwt.exceptions.InvalidKeyError: Raised when the specified key is not in the proper format.
     :raise jwt.exceptions.InvalidAlgorithmError: Raised when the specified algorithm is not recognized by PyJWT.
     :raise jwt.exceptions.MissingRequiredClaimError: Raised when a claim that is required to be present is not contained in the claimset.
+    :raise revocation.TokenRevokedError: Raised when the token or its lab instance is revoked in the revocation store.
+    """
+
+    return _get_verifier(secret_key, algorithms, cache, json_codec, revocation_store).verify(token, vmi_name)
+
+
+def authorize_vmi_names(token: str, vmi_names: Iterable[str], secret_key: str, algorithms: Optional[List[str]] = None,
+                        cache: Optional[VerifiedTokenCache] = None,
+                        json_codec: Optional[JsonCodec] = None,
+                        revocation_store: Optional["RevocationStore"] = None
+                        ) -> Tuple[Dict[str, bool], LabInstanceTokenParams]:
+    """Decodes a token and checks many VM-names against it in one call.
+
+    :param token: The token to decode and verify.
+    :param vmi_names: The VM-names the user wants to use.
+    :param secret_key: Key that is used to decrypt the token.
+    :param algorithms: Allowed algorithms. If None, ['HS256'] is used.
+    :param cache: Optional cache of verified tokens. See ``decode_auth_token``.
+    :param json_codec: Codec that deserializes the claims. See ``decode_auth_token``.
+    :param revocation_store: Optional store of revoked tokens and lab instances. See ``revocation.RevocationStore``.
+    :return: Dictionary that maps every VM-name to True if it's allowed and the data contained in the token.
+    :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid or revoked. See ``verify_auth_token``.
+    """
+    return _get_verifier(secret_key, algorithms, cache, json_codec, revocation_store).authorize(token, vmi_names)
+
+
+def verify_auth_tokens_batch(pairs: Iterable[Tuple[str, str]], secret_key: str, algorithms: Optional[List[str]] = None,
+                             cache: Optional[VerifiedTokenCache] = None,
+                             json_codec: Optional[JsonCodec] = None,
+                             revocation_store: Optional["RevocationStore"] = None
+                             ) -> Iterator[TokenVerificationResult]:
+    """Verifies many tokens, e.g. all active sessions after a restart of a lab backend.
+
+    Works like ``verify_auth_token`` for every pair, but doesn't raise an exception for invalid tokens. The exception is
+    returned in the result instead. Identical tokens are only decoded once.
+
+    :param pairs: Iterable of (token, vmi_name) pairs.
+    :param secret_key: Key that is used to decrypt the tokens.
+    :param algorithms: Allowed algorithms. If None, ['HS256'] is used.
+    :param cache: Optional cache of verified tokens. See ``decode_auth_token``.
+    :param json_codec: Codec that deserializes the claims. See ``decode_auth_token``.
+    :param revocation_store: Optional store of revoked tokens and lab instances. Revoked tokens are returned with a ``revocation.TokenRevokedError``. See ``revocation.RevocationStore``.
+    :return: Iterator of results in the order of the pairs.
     """
+    return _get_verifier(secret_key, algorithms, cache, json_codec, revocation_store).verify_batch(pairs)
+
 
-    data = decode_auth_token(token, secret_key, algorithms=algorithms)
-    is_forbidden = vmi_name not in data.allowed_vmi_names
+def verify_auth_token_staged(token: Token, vmi_name: str, secret_key: str, algorithms: Optional[List[str]] = None,
+                             cache: Optional[VerifiedTokenCache] = None,
+                             json_codec: Optional[JsonCodec] = None,
+                             revocation_store: Optional["RevocationStore"] = None) -> TokenVerificationResult:
+    """Verifies a token like ``verify_auth_token`` but checks the signature last.
 
-    return not is_forbidden, data
+    Malformed, expired and forbidden tokens are rejected by cheap checks of the unverified payload, so misbehaving
+    clients don't cost a signature check. The result contains the stage that rejected the token. See
+    ``TokenVerifier.verify_staged``.
+
+    :param token: The token to verify.
+    :param vmi_name: The vmi_name the user wants to use.
+    :param secret_key: Key that is used to decrypt the token.
+    :param algorithms: Allowed algorithms. If None, ['HS256'] is used.
+    :param cache: Optional cache of verified tokens. See ``decode_auth_token``.
+    :param json_codec: Codec that deserializes the claims. See ``decode_auth_token``.
+    :param revocation_store: Optional store of revoked tokens and lab instances. See ``revocation.RevocationStore``.
+    :return: The result of the verification. Invalid tokens don't raise an exception.
+    """
+    return _get_verifier(secret_key, algorithms, cache, json_codec, revocation_store).verify_staged(token, vmi_name)
@@ -0,0 +1,165 @@
+"""Verified token cache of LabOrchestrator auth.
+
+This module contains a bounded cache for tokens that already passed the signature and claim validation. It is used to
+avoid decoding the same token again and again, e.g. when websocket clients reconnect aggressively.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .auth import LabInstanceTokenParams
+
+
+CacheKey = Tuple[bytes, str, Tuple[str, ...]]
+
+
+def token_digest(token: Any) -> bytes:
+    """Calculates the digest under which a token is cached, so big tokens aren't kept in the cache.
+
+    :param token: The token as string or bytes.
+    :return: The sha256 digest of the token.
+    """
+    if isinstance(token, str):
+        token = token.encode("utf-8")
+    return hashlib.sha256(token).digest()
+
+
+def _snapshot(params: Any) -> Any:
+    """Returns the copy of mutable params that is stored in the cache. Immutable params are stored as they are.
+
+    The matcher of the allowed VM-names is built once here and shared by all hits.
+    """
+    if hasattr(params, "__dict__"):
+        snapshot = object.__new__(params.__class__)
+        snapshot.__dict__.update(params.__dict__)
+        snapshot.__dict__["allowed_vmi_names"] = tuple(params.allowed_vmi_names)
+        params = snapshot
+    getattr(params, "vmi_matcher", None)
+    return params
+
+
+def _copy(params: Any) -> Any:
+    """Returns a copy of cached mutable params with a new ``allowed_vmi_names`` list."""
+    if not hasattr(params, "__dict__"):
+        return params
+    copy = object.__new__(params.__class__)
+    copy.__dict__.update(params.__dict__)
+    copy.__dict__["allowed_vmi_names"] = list(params.allowed_vmi_names)
+    return copy
+
+
+def key_fingerprint(secret_key: Any) -> str:
+    """Calculates a stable identity of a key without keeping the key itself in the cache.
+
+    String and bytes keys are hashed with sha256. Asymmetric key objects are identified by the sha256 of their public key.
+
+    :param secret_key: The key that is used to decode tokens.
+    :return: A hex digest that identifies the key.
+    """
+    if isinstance(secret_key, str):
+        secret_key = secret_key.encode("utf-8")
+    if isinstance(secret_key, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(secret_key).hexdigest()
+    public_key = secret_key.public_key() if hasattr(secret_key, "public_key") else secret_key
+    if hasattr(public_key, "public_bytes"):
+        from cryptography.hazmat.primitives import serialization
+        der = public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+        return hashlib.sha256(der).hexdigest()
+    return "id:%x" % id(secret_key)
+
+
+class VerifiedTokenCache:
+    """Bounded LRU cache of verified tokens.
+
+    Entries are evicted when the ``exp`` claim of their token is reached or when the cache is full. Tokens are only
+    stored after a successful verification, so a hit can be returned without decoding the token again. The cache is
+    thread safe.
+
+    Tokens are cached by their digest. Every hit returns a new copy of cached ``LabInstanceTokenParams``, so callers can
+    modify ``allowed_vmi_names`` without changing the cached entry. ``additional_data`` isn't copied and shouldn't be
+    modified. Immutable ``FrozenLabInstanceTokenParams`` are returned as they are.
+
+    :param maxsize: Maximum amount of tokens that are kept in the cache.
+    :param clock: Function that returns the current UNIX time. Only needs to be changed in tests.
+    """
+
+    def __init__(self, maxsize: int = 1024, clock: Callable[[], float] = time.time):
+        if maxsize <= 0:
+            raise ValueError("maxsize needs to be greater than 0")
+        self.maxsize = maxsize
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[LabInstanceTokenParams, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(token: Any, secret_key: Any, algorithms: Sequence[str]) -> CacheKey:
+        """Creates the key under which a token is cached.
+
+        :param token: The token.
+        :param secret_key: The key that is used to decode the token.
+        :param algorithms: The allowed algorithms.
+        :return: A hashable cache key.
+        """
+        return token_digest(token), key_fingerprint(secret_key), tuple(algorithms)
+
+    def get(self, key: Hashable) -> "Optional[LabInstanceTokenParams]":
+        """Returns the cached data of a token.
+
+        :param key: The key created with ``make_key``.
+        :return: The cached data or None if the token is not cached or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                params, expires_at = entry
+                if expires_at is None or self._clock() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return _copy(params)
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, params: "LabInstanceTokenParams", expires_at: Optional[float] = None) -> None:
+        """Adds a verified token to the cache.
+
+        :param key: The key created with ``make_key``.
+        :param params: The data that is contained in the token.
+        :param expires_at: UNIX time of the ``exp`` claim. If None the entry is only evicted by the LRU policy.
+        """
+        if expires_at is not None and self._clock() >= expires_at:
+            return
+        params = _snapshot(params)
+        with self._lock:
+            self._entries[key] = (params, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        """Removes all expired entries.
+
+        :return: Amount of removed entries.
+        """
+        with self._lock:
+            now = self._clock()
+            expired = [key for key, (_, expires_at) in self._entries.items()
+                       if expires_at is not None and now >= expires_at]
+            for key in expired:
+                del self._entries[key]
+            return len(expired)
+
+    def clear(self) -> None:
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
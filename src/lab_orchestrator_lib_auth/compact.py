@@ -0,0 +1,124 @@
+"""Compact claim format of LabOrchestrator auth.
+
+The default claims repeat long keys like ``allowed_vmi_names`` and every VM-name in full, so tokens for big labs can
+exceed the size limits of URLs and headers. The compact format stores the same data with short keys::
+
+    {"id": 5, "exp": 1634000000, "li": {"l": 1, "i": 9, "n": "pentest-3-9", "v": ["~-ubuntu", "kali"]}}
+
+VM-names that start with the namespace name are stored relative to it with a leading ``~``. Names that really start with
+``~`` or ``=`` are escaped with a leading ``=``. ``additional_data`` is stored as ``a`` if it isn't None.
+
+The compressed variant stores the ``li`` object as raw deflate stream in base64url encoding in the ``z`` claim.
+
+Decoding detects the format by the claims, so tokens of all formats can be verified by the same verifier.
+"""
+import binascii
+import json
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+from ._lazy import lazy_import
+
+
+jwt = lazy_import('jwt', globals())
+
+
+COMPACT_CLAIM = 'li'
+COMPRESSED_CLAIM = 'z'
+MAX_DECOMPRESSED_SIZE = 1024 * 1024
+
+_RELATIVE = '~'
+_ESCAPE = '='
+
+
+def encode_vmi_names(namespace_name: str, allowed_vmi_names: Iterable[str]) -> List[str]:
+    """Encodes VM-names relative to the namespace name.
+
+    :param namespace_name: Name of the namespace.
+    :param allowed_vmi_names: The VM-names.
+    :return: The encoded VM-names.
+    """
+    encoded = []
+    for name in allowed_vmi_names:
+        if namespace_name and name.startswith(namespace_name):
+            name = _RELATIVE + name[len(namespace_name):]
+        elif name.startswith((_RELATIVE, _ESCAPE)):
+            name = _ESCAPE + name
+        encoded.append(name)
+    return encoded
+
+
+def decode_vmi_names(namespace_name: str, encoded_vmi_names: Iterable[str]) -> List[str]:
+    """Reverses ``encode_vmi_names``.
+
+    :param namespace_name: Name of the namespace.
+    :param encoded_vmi_names: The encoded VM-names.
+    :return: The VM-names.
+    """
+    names = []
+    for name in encoded_vmi_names:
+        if name.startswith(_RELATIVE):
+            name = namespace_name + name[1:]
+        elif name.startswith(_ESCAPE):
+            name = name[1:]
+        names.append(name)
+    return names
+
+
+def compact_claims(lab_id: Any, lab_instance_id: Any, namespace_name: str, allowed_vmi_names: Iterable[str],
+                   additional_data: Optional[Dict[str, Any]], compress: bool = False) -> Dict[str, Any]:
+    """Creates the compact claims of the lab instance without ``id`` and ``exp``.
+
+    :param lab_id: The id of the lab.
+    :param lab_instance_id: The id of the lab instance.
+    :param namespace_name: Name of the namespace the VMs are running into.
+    :param allowed_vmi_names: VM-names that the user is allowed to access.
+    :param additional_data: Additional data of the token.
+    :param compress: If True, the claims are compressed into the ``z`` claim.
+    :return: The claims.
+    """
+    lab_instance = {'l': lab_id, 'i': lab_instance_id, 'n': namespace_name,
+                    'v': encode_vmi_names(namespace_name, allowed_vmi_names)}
+    if additional_data is not None:
+        lab_instance['a'] = additional_data
+    if not compress:
+        return {COMPACT_CLAIM: lab_instance}
+    data = json.dumps(lab_instance, separators=(',', ':')).encode('utf-8')
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    data = compressor.compress(data) + compressor.flush()
+    return {COMPRESSED_CLAIM: jwt.utils.base64url_encode(data).decode('ascii')}
+
+
+def expand_claims(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the ``lab_instance`` claim of the default format for compact or compressed claims.
+
+    :param data: The decoded claims of a token in compact or compressed format.
+    :return: The ``lab_instance`` claim with the long keys.
+    :raise KeyError: Raised when the claims don't contain a lab instance.
+    :raise jwt.exceptions.DecodeError: Raised when the compressed claims are invalid or too big.
+    """
+    lab_instance = data.get(COMPACT_CLAIM)
+    if lab_instance is None:
+        lab_instance = _decompress(data[COMPRESSED_CLAIM])
+    namespace_name = lab_instance['n']
+    return {
+        'lab_id': lab_instance['l'],
+        'lab_instance_id': lab_instance['i'],
+        'namespace_name': namespace_name,
+        'allowed_vmi_names': decode_vmi_names(namespace_name, lab_instance['v']),
+        'additional_data': lab_instance.get('a'),
+    }
+
+
+def _decompress(value: str) -> Dict[str, Any]:
+    try:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        data = decompressor.decompress(jwt.utils.base64url_decode(value), MAX_DECOMPRESSED_SIZE)
+        if decompressor.unconsumed_tail:
+            raise jwt.exceptions.DecodeError("Compressed claims are bigger than %d bytes" % MAX_DECOMPRESSED_SIZE)
+        lab_instance = json.loads(data)
+    except (TypeError, ValueError, binascii.Error, zlib.error) as e:
+        raise jwt.exceptions.DecodeError("Invalid compressed claims: %s" % e) from e
+    if not isinstance(lab_instance, dict):
+        raise jwt.exceptions.DecodeError("Invalid compressed claims: must be a json object")
+    return lab_instance
@@ -0,0 +1,108 @@
+"""JSON codecs of LabOrchestrator auth.
+
+The claims of a token are serialized with the stdlib ``json`` module by default. If ``orjson`` or ``ujson`` is installed,
+a faster codec can be used, which mostly matters for tokens with a big ``additional_data`` payload.
+"""
+import json
+from typing import Any
+
+from ._lazy import lazy_import
+
+# the codec libraries are only imported when a codec is used for the first time
+try:
+    orjson = lazy_import('orjson', globals())
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    ujson = lazy_import('ujson', globals())
+except ImportError:  # pragma: no cover
+    ujson = None
+
+
+class JsonCodec:
+    """Serializes the claims of a token.
+
+    Subclasses need to implement ``dumps`` and ``loads``. ``loads`` needs to raise a ``ValueError`` for invalid json.
+    """
+    name = 'abstract'
+
+    def dumps(self, obj: Any) -> bytes:
+        """Serializes an object to compact json.
+
+        :param obj: The json serializable object.
+        :return: The utf-8 encoded json.
+        """
+        raise NotImplementedError()
+
+    def loads(self, data: bytes) -> Any:
+        """Deserializes json.
+
+        :param data: The utf-8 encoded json.
+        :return: The deserialized object.
+        :raise ValueError: Raised when the data isn't valid json.
+        """
+        raise NotImplementedError()
+
+    def __repr__(self) -> str:
+        return '%s()' % self.__class__.__name__
+
+
+class StdlibJsonCodec(JsonCodec):
+    """Codec that uses the stdlib ``json`` module. It creates exactly the same tokens as PyJWT."""
+    name = 'json'
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JsonCodec):
+    """Codec that uses ``orjson``. Non-ASCII characters are not escaped, so tokens can differ from the stdlib codec."""
+    name = 'orjson'
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class UjsonCodec(JsonCodec):
+    """Codec that uses ``ujson``."""
+    name = 'ujson'
+
+    def dumps(self, obj: Any) -> bytes:
+        return ujson.dumps(obj).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        return ujson.loads(data)
+
+
+_CODECS = {
+    'json': StdlibJsonCodec(),
+    'orjson': OrjsonCodec() if orjson is not None else None,
+    'ujson': UjsonCodec() if ujson is not None else None,
+}
+
+
+def get_json_codec(name: str = 'auto') -> JsonCodec:
+    """Returns a json codec.
+
+    :param name: Name of the codec: ``json``, ``orjson``, ``ujson`` or ``auto``. ``auto`` returns the fastest installed codec.
+    :return: The codec.
+    :raise ValueError: Raised when the codec is unknown.
+    :raise ImportError: Raised when the library of the codec is not installed.
+    """
+    if name == 'auto':
+        for candidate in ('orjson', 'ujson', 'json'):
+            if _CODECS[candidate] is not None:
+                return _CODECS[candidate]
+    if name not in _CODECS:
+        raise ValueError("Unknown json codec '%s'" % name)
+    codec = _CODECS[name]
+    if codec is None:
+        raise ImportError("The json codec '%s' is not installed" % name)
+    return codec
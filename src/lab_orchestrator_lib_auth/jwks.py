@@ -0,0 +1,200 @@
+"""Loading of verification keys from local JWKS files.
+
+A ``JwksKeyProvider`` reads the public keys of a JSON Web Key Set file or of a directory of such files once, parses them
+into key objects and selects the key of a token by its ``kid`` header. When the files change, the keys are reloaded in
+the background while the old keys keep verifying tokens (stale-while-revalidate), so a verification never waits for a
+reload.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from . import keyring as _keyring
+from ._lazy import lazy_import
+from .auth import LabInstanceTokenParams, TokenVerifier
+from .cache import VerifiedTokenCache
+from .keyring import KidIndexedVerifier
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .revocation import RevocationStore
+
+
+jwt = lazy_import('jwt', globals())
+
+
+_EC_ALGORITHMS = {'P-256': 'ES256', 'P-384': 'ES384', 'P-521': 'ES512', 'secp256k1': 'ES256K'}
+_Signature = Tuple[Tuple[str, int, int], ...]
+
+
+def _jwk_algorithm(jwk: Dict[str, Any]) -> Optional[str]:
+    algorithm = jwk.get('alg')
+    if algorithm is not None:
+        return algorithm
+    kty = jwk.get('kty')
+    if kty == 'RSA':
+        return 'RS256'
+    if kty == 'EC':
+        return _EC_ALGORITHMS.get(jwk.get('crv', 'P-256'))
+    if kty == 'OKP' and jwk.get('crv') == 'Ed25519':
+        return 'EdDSA'
+    if kty == 'oct':
+        return 'HS256'
+    return None
+
+
+class JwksKeyProvider(KidIndexedVerifier):
+    """Verification keys of a local JWKS file or directory.
+
+    The path can be a file that contains a JWK Set (``{"keys": [...]}``) or a single JWK, or a directory whose
+    ``*.json`` files are loaded. Keys without ``kid``, keys whose ``use`` isn't ``sig`` and keys of algorithms that
+    aren't allowed are ignored. Every key only verifies tokens of its own algorithm.
+
+    The modification times of the files are checked at most every ``check_interval`` seconds. If they changed, the keys
+    are reloaded in a background thread and the old keys are used until the reload is finished. If a reload fails,
+    e.g. because a file is written at the moment, the old keys are kept and the reload is retried with the next check.
+
+    :param path: Path of the JWKS file or directory.
+    :param algorithms: Optional list of allowed algorithms. If None, all algorithms are allowed.
+    :param cache: Optional cache of verified tokens that is shared by all keys.
+    :param params_class: Class of the decoded data. See ``auth.TokenVerifier``.
+    :param fallback_kid: Key id that is used for tokens without ``kid`` header.
+    :param check_interval: Minimum amount of seconds between two checks of the modification times.
+    :param background: If False, reloads are done in the calling thread.
+    :param clock: Monotonic clock in seconds. Only needs to be changed in tests.
+    :param revocation_store: Optional store of revoked tokens and lab instances that is checked for all keys. See ``revocation.RevocationStore``.
+    :raise OSError: Raised when the path can't be read.
+    :raise ValueError: Raised when a file isn't valid json or doesn't contain a JWK or JWK Set object.
+    :raise jwt.exceptions.PyJWTError: Raised when a key can't be parsed, e.g. ``PyJWKError`` or ``InvalidKeyError`` for a missing or unsupported ``kty``.
+    """
+
+    def __init__(self, path: str, algorithms: Optional[List[str]] = None, cache: Optional[VerifiedTokenCache] = None,
+                 params_class: type = LabInstanceTokenParams, fallback_kid: Optional[str] = None,
+                 check_interval: float = 1.0, background: bool = True,
+                 clock: Callable[[], float] = time.monotonic,
+                 revocation_store: Optional["RevocationStore"] = None):
+        super().__init__(fallback_kid)
+        self.path = path
+        self.algorithms = None if algorithms is None else frozenset(algorithms)
+        self.cache = cache
+        self.revocation_store = revocation_store
+        self.params_class = params_class
+        self.check_interval = check_interval
+        self.background = background
+        self.last_error: Optional[Exception] = None
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._reloading: Optional[threading.Thread] = None
+        self._keys: Dict[str, Tuple[Dict[str, Any], TokenVerifier]] = {}
+        self._signature: Optional[_Signature] = None
+        self._next_check = 0.0
+        self.reload()
+
+    @property
+    def kids(self) -> List[str]:
+        """The ids of all loaded keys."""
+        return list(self._keys)
+
+    def _files(self) -> List[str]:
+        if os.path.isdir(self.path):
+            return sorted(os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith('.json'))
+        return [self.path]
+
+    def _current_signature(self) -> _Signature:
+        signature = []
+        for file in self._files():
+            stat = os.stat(file)
+            signature.append((file, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _parse(self, files: List[str]) -> Dict[str, Tuple[Dict[str, Any], TokenVerifier]]:
+        keys = {}
+        for file in files:
+            with open(file, 'rb') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("%s doesn't contain a JWK or JWK Set object" % file)
+            jwks = data['keys'] if 'keys' in data else [data]
+            if not isinstance(jwks, list):
+                raise ValueError("The keys of %s aren't a list" % file)
+            for jwk in jwks:
+                if not isinstance(jwk, dict):
+                    raise ValueError("%s contains a JWK that isn't an object" % file)
+                kid = jwk.get('kid')
+                algorithm = _jwk_algorithm(jwk)
+                if kid is None or jwk.get('use', 'sig') != 'sig' or algorithm is None:
+                    continue
+                if self.algorithms is not None and algorithm not in self.algorithms:
+                    continue
+                old = self._keys.get(kid)
+                if old is not None and old[0] == jwk:
+                    keys[kid] = old
+                    continue
+                key = jwt.PyJWK(jwk, algorithm).key
+                keys[kid] = (jwk, TokenVerifier(key, [algorithm], cache=self.cache, params_class=self.params_class,
+                                                revocation_store=self.revocation_store))
+        return keys
+
+    def reload(self) -> None:
+        """Loads the keys in the calling thread.
+
+        :raise OSError: Raised when the path can't be read.
+        :raise ValueError: Raised when a file isn't valid json or doesn't contain a JWK or JWK Set object.
+        :raise jwt.exceptions.PyJWTError: Raised when a key can't be parsed.
+        """
+        signature = self._current_signature()
+        self._keys = self._parse([file for file, _, _ in signature])
+        self._signature = signature
+        self._next_check = self._clock() + self.check_interval
+
+    def _reload_quietly(self) -> None:
+        try:
+            self.reload()
+            self.last_error = None
+        except (OSError, ValueError, jwt.exceptions.PyJWTError) as e:
+            self.last_error = e
+        finally:
+            self._reloading = None
+
+    def refresh(self) -> bool:
+        """Checks the modification times of the files and starts a reload if they changed.
+
+        :return: True if a reload was started.
+        """
+        with self._lock:
+            if self._reloading is not None:
+                return False
+            self._next_check = self._clock() + self.check_interval
+            try:
+                changed = self._current_signature() != self._signature
+            except OSError as e:
+                self.last_error = e
+                return False
+            if not changed:
+                return False
+            if not self.background:
+                self._reloading = threading.current_thread()
+            else:
+                self._reloading = threading.Thread(target=self._reload_quietly, name='jwks-reload', daemon=True)
+                self._reloading.start()
+                return True
+        self._reload_quietly()
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Waits until a running background reload is finished.
+
+        :param timeout: Maximum amount of seconds to wait.
+        """
+        thread = self._reloading
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def get_verifier(self, kid: str) -> TokenVerifier:
+        if self._clock() >= self._next_check:
+            self.refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            raise _keyring.UnknownKeyIdError("Unknown key id '%s'" % kid)
+        return key[1]
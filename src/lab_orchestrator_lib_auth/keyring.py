@@ -0,0 +1,297 @@
+"""Key rotation of LabOrchestrator auth.
+
+A ``KeyRing`` holds several keys that are identified by a key id. New tokens are signed with the active key and get its
+key id as ``kid`` header. Decoding reads the ``kid`` of the unverified header and selects the matching key from a
+dictionary, so rotating a key doesn't invalidate the tokens of running lab sessions and doesn't cost extra signature
+checks.
+"""
+import binascii
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from ._lazy import LazyExceptions, lazy_import
+from .auth import Identifier, LabInstanceTokenParams, Token, TokenIssuer, TokenVerifier, _normalize_token
+from .cache import VerifiedTokenCache
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .revocation import RevocationStore
+
+
+jwt = lazy_import('jwt', globals())
+# the exceptions subclass the exceptions of PyJWT, so they are only created when they're used, see ``_lazy``
+_errors = LazyExceptions(globals(), {
+    'UnknownKeyIdError': (lambda: jwt.exceptions.InvalidTokenError,
+                          "Raised when the key id of a token is unknown or the key isn't valid anymore."),
+})
+__getattr__ = _errors.get
+
+
+PENDING = 'pending'
+ACTIVE = 'active'
+RETIRING = 'retiring'
+EXPIRED = 'expired'
+
+
+def read_unverified_kid(token: Token) -> Optional[str]:
+    """Reads the ``kid`` of the header of a token without verifying the token.
+
+    :param token: The token.
+    :return: The key id or None if the header has no ``kid``.
+    :raise jwt.exceptions.DecodeError: Raised when the header can't be decoded.
+    :raise jwt.exceptions.InvalidTokenError: Raised when the ``kid`` isn't a string.
+    """
+    token = _normalize_token(token)
+    separator = '.' if isinstance(token, str) else b'.'
+    header_segment, found, _ = token.partition(separator)
+    if not found:
+        raise jwt.exceptions.DecodeError("Not enough segments")
+    try:
+        header = json.loads(jwt.utils.base64url_decode(header_segment))
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise jwt.exceptions.DecodeError("Invalid header: %s" % e) from e
+    if not isinstance(header, dict):
+        raise jwt.exceptions.DecodeError("Invalid header string: must be a json object")
+    kid = header.get('kid')
+    if kid is not None and not isinstance(kid, str):
+        raise jwt.exceptions.InvalidTokenError("Key ID header parameter must be a string")
+    return kid
+
+
+class KidIndexedVerifier:
+    """Base class of key sources that select the verifier of a token by its ``kid`` header.
+
+    Subclasses need to implement ``get_verifier``.
+
+    :param fallback_kid: Key id that is used for tokens without ``kid`` header, e.g. tokens created before the rotation was introduced.
+    """
+
+    def __init__(self, fallback_kid: Optional[str] = None):
+        self.fallback_kid = fallback_kid
+
+    def get_verifier(self, kid: str) -> TokenVerifier:
+        """Returns the verifier of a key.
+
+        :param kid: The key id.
+        :return: The verifier.
+        :raise UnknownKeyIdError: Raised when the key is unknown or isn't valid anymore.
+        """
+        raise NotImplementedError()
+
+    def verifier_for(self, token: Token) -> TokenVerifier:
+        """Returns the verifier that matches the ``kid`` header of a token.
+
+        :param token: The token.
+        :return: The verifier.
+        :raise UnknownKeyIdError: Raised when the key is unknown or the token has no ``kid`` and there is no fallback.
+        """
+        kid = read_unverified_kid(token)
+        if kid is None:
+            kid = self.fallback_kid
+            if kid is None:
+                raise _errors.UnknownKeyIdError("Token has no key id")
+        return self.get_verifier(kid)
+
+    def decode_auth_token(self, token: Token) -> LabInstanceTokenParams:
+        """Decodes a JWT token with the key of its ``kid`` header.
+
+        :param token: The token to decode.
+        :return: The data that is contained in the token.
+        :raise UnknownKeyIdError: Raised when the key is unknown or isn't valid anymore.
+        :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid. See ``auth.decode_auth_token``.
+        """
+        return self.verifier_for(token).decode(token)
+
+    def verify_auth_token(self, token: Token, vmi_name: str) -> Tuple[bool, LabInstanceTokenParams]:
+        """Decodes a token with the key of its ``kid`` header and checks if the vmi_name is allowed in the token.
+
+        :param token: The token to decode and verify.
+        :param vmi_name: The vmi_name the user wants to use.
+        :return: The result of the verification as a boolean and the data contained in the token.
+        :raise UnknownKeyIdError: Raised when the key is unknown or isn't valid anymore.
+        :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid. See ``auth.verify_auth_token``.
+        """
+        return self.verifier_for(token).verify(token, vmi_name)
+
+
+class _Key:
+    __slots__ = ('kid', 'algorithm', 'issuer', 'verifier', 'activates_at', 'retires_at', 'retired')
+
+    def __init__(self, kid: str, algorithm: str, issuer: Optional[TokenIssuer], verifier: TokenVerifier,
+                 activates_at: float, retires_at: Optional[float]):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.issuer = issuer
+        self.verifier = verifier
+        self.activates_at = activates_at
+        self.retires_at = retires_at
+        self.retired = False
+
+
+class KeyRing(KidIndexedVerifier):
+    """Keys that are selected by their key id.
+
+    Every key has one of these states:
+
+    - ``pending``: The key is scheduled and not used yet.
+    - ``active``: The newest activated key with a signing key. New tokens are signed with it.
+    - ``retiring``: The key was replaced by a newer key or retired, so it only verifies the tokens that are still valid.
+    - ``expired``: The ``retires_at`` time of the key is reached and tokens of this key are rejected.
+
+    A scheduled rollover is done by adding the next key with ``activates_at`` in the future and retiring the old key
+    with ``retires_at`` set to the activation time plus the maximum token lifetime. The key ring can be modified while
+    other threads use it.
+
+    :param fallback_kid: Key id that is used for tokens without ``kid`` header.
+    :param cache: Optional cache of verified tokens that is shared by all keys.
+    :param params_class: Class of the decoded data. See ``auth.TokenVerifier``.
+    :param clock: Function that returns the current UNIX time. Only needs to be changed in tests.
+    :param revocation_store: Optional store of revoked tokens and lab instances that is checked for all keys. See ``revocation.RevocationStore``.
+    """
+
+    def __init__(self, fallback_kid: Optional[str] = None, cache: Optional[VerifiedTokenCache] = None,
+                 params_class: type = LabInstanceTokenParams, clock: Callable[[], float] = time.time,
+                 revocation_store: Optional["RevocationStore"] = None):
+        super().__init__(fallback_kid)
+        self.cache = cache
+        self.revocation_store = revocation_store
+        self.params_class = params_class
+        self._clock = clock
+        self._keys: Dict[str, _Key] = {}
+        self._lock = threading.Lock()
+
+    def add_key(self, kid: str, signing_key: Any = None, verification_key: Any = None, algorithm: str = 'HS256',
+                activates_at: Optional[float] = None, retires_at: Optional[float] = None) -> None:
+        """Adds a key.
+
+        :param kid: Unique key id that is added to the header of the tokens.
+        :param signing_key: Key that signs new tokens. If None, the key is only used for verification.
+        :param verification_key: Key that verifies tokens. If None, the signing key is used, which works for HMAC algorithms.
+        :param algorithm: Algorithm of the key.
+        :param activates_at: UNIX time at which the key starts to sign new tokens. If None, the key is activated now.
+        :param retires_at: Optional UNIX time after which tokens of this key are rejected.
+        :raise ValueError: Raised when the key id already exists or there is no key at all.
+        """
+        if verification_key is None:
+            verification_key = signing_key
+        if verification_key is None:
+            raise ValueError("A signing or verification key is required")
+        issuer = None if signing_key is None else TokenIssuer(signing_key, algorithm, kid=kid)
+        verifier = TokenVerifier(verification_key, [algorithm], cache=self.cache, params_class=self.params_class,
+                                 revocation_store=self.revocation_store)
+        key = _Key(kid, algorithm, issuer, verifier, self._clock() if activates_at is None else activates_at,
+                   retires_at)
+        with self._lock:
+            if kid in self._keys:
+                raise ValueError("Key id '%s' already exists" % kid)
+            self._keys = {**self._keys, kid: key}
+
+    def retire_key(self, kid: str, retires_at: Optional[float] = None) -> None:
+        """Stops signing new tokens with a key.
+
+        :param kid: The key id.
+        :param retires_at: Optional UNIX time after which tokens of this key are rejected.
+        :raise KeyError: Raised when the key id is unknown.
+        """
+        with self._lock:
+            key = self._keys[kid]
+            key.retired = True
+            if retires_at is not None:
+                key.retires_at = retires_at
+
+    def remove_key(self, kid: str) -> None:
+        """Removes a key, so tokens of this key are rejected immediately.
+
+        :param kid: The key id.
+        :raise KeyError: Raised when the key id is unknown.
+        """
+        with self._lock:
+            keys = dict(self._keys)
+            del keys[kid]
+            self._keys = keys
+
+    def remove_expired_keys(self) -> List[str]:
+        """Removes all keys whose ``retires_at`` time is reached.
+
+        :return: The removed key ids.
+        """
+        now = self._clock()
+        with self._lock:
+            expired = [kid for kid, key in self._keys.items() if key.retires_at is not None and now >= key.retires_at]
+            self._keys = {kid: key for kid, key in self._keys.items() if kid not in expired}
+        return expired
+
+    @property
+    def kids(self) -> List[str]:
+        """The ids of all keys."""
+        return list(self._keys)
+
+    def _active_key(self, now: float) -> Optional[_Key]:
+        active = None
+        for key in self._keys.values():
+            if key.issuer is None or key.retired or key.activates_at > now:
+                continue
+            if key.retires_at is not None and now >= key.retires_at:
+                continue
+            if active is None or key.activates_at >= active.activates_at:
+                active = key
+        return active
+
+    def active_kid(self) -> Optional[str]:
+        """Returns the id of the key that signs new tokens.
+
+        :return: The key id or None if there is no active key.
+        """
+        key = self._active_key(self._clock())
+        return None if key is None else key.kid
+
+    def state(self, kid: str) -> str:
+        """Returns the state of a key.
+
+        :param kid: The key id.
+        :return: ``pending``, ``active``, ``retiring`` or ``expired``.
+        :raise KeyError: Raised when the key id is unknown.
+        """
+        now = self._clock()
+        key = self._keys[kid]
+        if key.retires_at is not None and now >= key.retires_at:
+            return EXPIRED
+        if key.activates_at > now:
+            return PENDING
+        if key is self._active_key(now):
+            return ACTIVE
+        return RETIRING
+
+    def issuer(self) -> TokenIssuer:
+        """Returns the issuer of the active key.
+
+        :return: The issuer.
+        :raise UnknownKeyIdError: Raised when there is no active key.
+        """
+        key = self._active_key(self._clock())
+        if key is None:
+            raise _errors.UnknownKeyIdError("There is no active key")
+        return key.issuer
+
+    def get_verifier(self, kid: str) -> TokenVerifier:
+        key = self._keys.get(kid)
+        if key is None:
+            raise _errors.UnknownKeyIdError("Unknown key id '%s'" % kid)
+        if key.retires_at is not None and self._clock() >= key.retires_at:
+            raise _errors.UnknownKeyIdError("Key '%s' is expired" % kid)
+        return key.verifier
+
+    def generate_auth_token(self, user_id: Identifier, lab_instance_token_params: LabInstanceTokenParams,
+                            expires_in: int = 60 * 60, expires_at: Optional[int] = None) -> str:
+        """Generates a JWT token with the active key and adds its ``kid`` to the header.
+
+        :param user_id: Id of the user.
+        :param lab_instance_token_params: The data that is included in the token.
+        :param expires_in: Amount of seconds the token is valid.
+        :param expires_at: Optional UNIX time at which this token expires. Overwrites expires_in.
+        :return: A JWT token.
+        :raise UnknownKeyIdError: Raised when there is no active key.
+        """
+        return self.issuer().generate(user_id, lab_instance_token_params, expires_in=expires_in,
+                                      expires_at=expires_at)
@@ -0,0 +1,188 @@
+"""Instrumentation of LabOrchestrator auth.
+
+When a sink is set with ``set_metrics_sink``, every generation, decoding and verification of a token reports its
+duration and outcome, and verified token caches report their hits and misses. Without a sink the overhead is one
+attribute lookup per call.
+
+Outcomes are ``ok``, ``forbidden`` for verifications of a VM-name that isn't allowed, or the class name of the raised
+exception, e.g. ``ExpiredSignatureError``.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional, Sequence
+
+
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   float('inf'))
+
+
+class MetricsSink:
+    """Receives the metrics of the auth module. Subclasses need to be thread safe."""
+
+    def observe(self, operation: str, seconds: float, outcome: str) -> None:
+        """Called after every operation.
+
+        :param operation: ``generate``, ``decode`` or ``verify``.
+        :param seconds: Duration of the operation.
+        :param outcome: ``ok``, ``forbidden`` or the class name of the raised exception.
+        """
+        raise NotImplementedError()
+
+    def count_cache(self, event: str) -> None:
+        """Called for every lookup in a verified token cache.
+
+        :param event: ``hit`` or ``miss``.
+        """
+        raise NotImplementedError()
+
+
+class CallbackSink(MetricsSink):
+    """Sink that forwards the metrics to callbacks.
+
+    :param on_observe: Called with (operation, seconds, outcome) after every operation.
+    :param on_cache: Optional callback that is called with the event of every cache lookup.
+    """
+
+    def __init__(self, on_observe: Callable[[str, float, str], Any],
+                 on_cache: Optional[Callable[[str], Any]] = None):
+        self.on_observe = on_observe
+        self.on_cache = on_cache
+
+    def observe(self, operation: str, seconds: float, outcome: str) -> None:
+        self.on_observe(operation, seconds, outcome)
+
+    def count_cache(self, event: str) -> None:
+        if self.on_cache is not None:
+            self.on_cache(event)
+
+
+class InMemoryCollector(MetricsSink):
+    """Sink that keeps timing histograms and counters in memory.
+
+    :param buckets: Upper bounds of the histogram buckets in seconds. The last bucket should be infinity.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Removes all collected metrics."""
+        with self._lock:
+            self._histograms: Dict[str, Dict[str, Any]] = {}
+            self.outcomes: Counter = Counter()
+            self.cache_events: Counter = Counter()
+
+    def observe(self, operation: str, seconds: float, outcome: str) -> None:
+        with self._lock:
+            histogram = self._histograms.get(operation)
+            if histogram is None:
+                histogram = self._histograms[operation] = {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            index = bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                histogram['buckets'][index] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            self.outcomes[(operation, outcome)] += 1
+
+    def count_cache(self, event: str) -> None:
+        with self._lock:
+            self.cache_events[event] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns a copy of the collected metrics.
+
+        :return: Dictionary with the histograms per operation (non-cumulative bucket counts, count and sum), the
+            outcome counters as ``{operation: {outcome: count}}`` and the cache counters.
+        """
+        with self._lock:
+            outcomes: Dict[str, Dict[str, int]] = {}
+            for (operation, outcome), count in self.outcomes.items():
+                outcomes.setdefault(operation, {})[outcome] = count
+            return {
+                'buckets': list(self.buckets),
+                'histograms': {operation: {'buckets': list(histogram['buckets']), 'count': histogram['count'],
+                                           'sum': histogram['sum']}
+                               for operation, histogram in self._histograms.items()},
+                'outcomes': outcomes,
+                'cache': dict(self.cache_events),
+            }
+
+
+class PrometheusSink(MetricsSink):
+    """Sink that exports the metrics with ``prometheus_client``, which needs to be installed.
+
+    :param registry: Registry of the metrics. If None, the default registry of ``prometheus_client`` is used.
+    :param namespace: Prefix of the metric names.
+    :param buckets: Upper bounds of the histogram buckets in seconds.
+    """
+
+    def __init__(self, registry: Any = None, namespace: str = 'lab_orchestrator_auth',
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        import prometheus_client
+        kwargs = {} if registry is None else {'registry': registry}
+        self._duration = prometheus_client.Histogram('%s_duration_seconds' % namespace,
+                                                     'Duration of token operations.', ['operation'],
+                                                     buckets=tuple(buckets), **kwargs)
+        self._results = prometheus_client.Counter('%s_results_total' % namespace,
+                                                  'Outcomes of token operations.', ['operation', 'outcome'], **kwargs)
+        self._cache = prometheus_client.Counter('%s_cache_total' % namespace,
+                                                'Lookups in verified token caches.', ['event'], **kwargs)
+
+    def observe(self, operation: str, seconds: float, outcome: str) -> None:
+        self._duration.labels(operation).observe(seconds)
+        self._results.labels(operation, outcome).inc()
+
+    def count_cache(self, event: str) -> None:
+        self._cache.labels(event).inc()
+
+
+_sink: Optional[MetricsSink] = None
+
+
+def set_metrics_sink(sink: Optional[MetricsSink]) -> None:
+    """Enables the instrumentation.
+
+    :param sink: The sink that receives the metrics. None disables the instrumentation.
+    """
+    global _sink
+    _sink = sink
+
+
+def get_metrics_sink() -> Optional[MetricsSink]:
+    """Returns the current sink.
+
+    :return: The sink or None if the instrumentation is disabled.
+    """
+    return _sink
+
+
+def verification_outcome(success: bool, error: Optional[Exception]) -> str:
+    """Returns the outcome of a verification that returns its exception instead of raising it, e.g. in a batch.
+
+    :param success: True if the token is valid and the VM-name is allowed.
+    :param error: The exception of an invalid token or None.
+    :return: ``ok``, ``forbidden`` or the class name of the exception.
+    """
+    if error is not None:
+        return error.__class__.__name__
+    return 'ok' if success else 'forbidden'
+
+
+def instrument(sink: MetricsSink, operation: str, function: Callable, *args, **kwargs) -> Any:
+    """Calls a function and reports its duration and outcome to a sink.
+
+    A result of a ``verify`` operation with a False verdict is reported as ``forbidden``.
+    """
+    start = perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    except Exception as e:
+        sink.observe(operation, perf_counter() - start, e.__class__.__name__)
+        raise
+    outcome = 'forbidden' if operation == 'verify' and not result[0] else 'ok'
+    sink.observe(operation, perf_counter() - start, outcome)
+    return result
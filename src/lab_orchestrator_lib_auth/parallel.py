@@ -0,0 +1,169 @@
+"""Parallel verification of LabOrchestrator tokens.
+
+RSA and EC signature checks are CPU-bound, so verifying tokens in one thread can't use all cores of a machine. This module
+contains a verifier that distributes the work to a process pool, or to a thread pool for backends that release the GIL.
+"""
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Deque, Iterable, Iterator, List, Optional, Tuple, TYPE_CHECKING
+
+from ._lazy import lazy_import
+from .auth import LabInstanceTokenParams, TokenVerificationResult, TokenVerifier
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .revocation import RevocationStore
+
+
+jwt = lazy_import('jwt', globals())
+
+
+_worker_verifier: Optional[TokenVerifier] = None
+
+
+def _init_worker(verifier: TokenVerifier) -> None:
+    global _worker_verifier
+    _worker_verifier = verifier
+
+
+def _decode_in_worker(token: str) -> LabInstanceTokenParams:
+    return _worker_verifier.decode(token)
+
+
+def _verify_in_worker(token: str, vmi_name: str) -> Tuple[bool, LabInstanceTokenParams]:
+    return _worker_verifier.verify(token, vmi_name)
+
+
+def _verify_batch_in_worker(pairs: List[Tuple[str, str]]) -> List[TokenVerificationResult]:
+    return list(_worker_verifier.verify_batch(pairs))
+
+
+def _then(future: Future, check: Callable[[Any], Any]) -> Future:
+    """Returns a future of the result of a future that is only set if ``check`` doesn't raise an exception for it."""
+    checked: Future = Future()
+
+    def done(finished: Future) -> None:
+        try:
+            result = finished.result()
+            check(result)
+        except BaseException as e:
+            checked.set_exception(e)
+        else:
+            checked.set_result(result)
+
+    future.add_done_callback(done)
+    return checked
+
+
+class ParallelTokenVerifier:
+    """Verifies tokens in a process pool or thread pool.
+
+    Every worker process gets its own ``TokenVerifier``, so the key is parsed once per worker and not for every token.
+    In process mode the key needs to be a string or bytes because it's sent to the workers. The revocation store stays
+    in this process and checks the results of the workers, so revocations take effect immediately. The verifier can be
+    used as context manager to shut down the pool.
+
+    :param secret_key: Key that should be used to decrypt the tokens.
+    :param algorithms: Allowed algorithms. If None, ['HS256'] is used.
+    :param max_workers: Amount of workers. If None, the default of the executor is used.
+    :param use_threads: Use a thread pool instead of a process pool.
+    :param mp_context: Optional multiprocessing context of the process pool.
+    :param revocation_store: Optional store of revoked tokens and lab instances. See ``revocation.RevocationStore``.
+    """
+
+    def __init__(self, secret_key: Any, algorithms: Optional[List[str]] = None, max_workers: Optional[int] = None,
+                 use_threads: bool = False, mp_context: Any = None,
+                 revocation_store: Optional["RevocationStore"] = None):
+        # worker processes get a verifier without store, the results are checked against the store in this process
+        self._verifier = TokenVerifier(secret_key, algorithms,
+                                       revocation_store=revocation_store if use_threads else None)
+        self.use_threads = use_threads
+        self.revocation_store = revocation_store
+        self._max_pending = 2 * (max_workers or os.cpu_count() or 1)
+        if use_threads:
+            self._executor: Executor = ThreadPoolExecutor(max_workers=max_workers)
+        else:
+            if not isinstance(secret_key, (str, bytes)):
+                raise TypeError("secret_key needs to be a string or bytes to be sent to worker processes")
+            self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context,
+                                                 initializer=_init_worker, initargs=(self._verifier,))
+
+    def submit_decode(self, token: str) -> "Future[LabInstanceTokenParams]":
+        """Decodes a token in the pool.
+
+        :param token: The token to decode.
+        :return: A future of the data that is contained in the token. See ``TokenVerifier.decode``.
+        """
+        if self.use_threads:
+            return self._executor.submit(self._verifier.decode, token)
+        future = self._executor.submit(_decode_in_worker, token)
+        if self.revocation_store is None:
+            return future
+        return _then(future, self.revocation_store.check)
+
+    def submit_verify(self, token: str, vmi_name: str) -> "Future[Tuple[bool, LabInstanceTokenParams]]":
+        """Decodes a token in the pool and checks if the vmi_name is allowed in the token.
+
+        :param token: The token to decode and verify.
+        :param vmi_name: The vmi_name the user wants to use.
+        :return: A future of the result of the verification. See ``TokenVerifier.verify``.
+        """
+        if self.use_threads:
+            return self._executor.submit(self._verifier.verify, token, vmi_name)
+        future = self._executor.submit(_verify_in_worker, token, vmi_name)
+        if self.revocation_store is None:
+            return future
+        return _then(future, lambda result: self.revocation_store.check(result[1]))
+
+    def verify_batch(self, pairs: Iterable[Tuple[str, str]], chunksize: int = 256) -> Iterator[TokenVerificationResult]:
+        """Verifies many tokens in the pool.
+
+        The pairs are split into chunks that are verified by the workers like in ``TokenVerifier.verify_batch``. Only a
+        few chunks per worker are submitted at once, so the pairs can be a lazy iterable of any size.
+
+        :param pairs: Iterable of (token, vmi_name) pairs.
+        :param chunksize: Amount of pairs that are sent to a worker at once.
+        :return: Iterator of results in the order of the pairs.
+        """
+        if chunksize <= 0:
+            raise ValueError("chunksize needs to be greater than 0")
+        batch_function = self._verify_batch_in_thread if self.use_threads else _verify_batch_in_worker
+        iterator = iter(pairs)
+        pending: Deque[Future] = deque()
+        while True:
+            chunk = list(islice(iterator, chunksize))
+            if chunk:
+                pending.append(self._executor.submit(batch_function, chunk))
+            if pending and (not chunk or len(pending) >= self._max_pending):
+                results = pending.popleft().result()
+                if self.revocation_store is not None and not self.use_threads:
+                    results = [self._check_revocation(result) for result in results]
+                yield from results
+            elif not chunk:
+                break
+
+    def _verify_batch_in_thread(self, pairs: List[Tuple[str, str]]) -> List[TokenVerificationResult]:
+        return list(self._verifier.verify_batch(pairs))
+
+    def _check_revocation(self, result: TokenVerificationResult) -> TokenVerificationResult:
+        if result.params is None:
+            return result
+        try:
+            self.revocation_store.check(result.params)
+        except jwt.exceptions.InvalidTokenError as e:
+            return TokenVerificationResult(result.token, result.vmi_name, False, None, e)
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shuts down the pool.
+
+        :param wait: Wait until all pending verifications are done.
+        """
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self) -> "ParallelTokenVerifier":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.shutdown()
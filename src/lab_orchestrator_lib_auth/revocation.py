@@ -0,0 +1,165 @@
+"""Revocation of tokens of LabOrchestrator auth.
+
+A ``RevocationStore`` contains the ids (``jti`` claim) of revoked tokens and revoked lab instances. A verifier with a
+store rejects revoked tokens with a ``TokenRevokedError`` although their signature and ``exp`` claim are still valid,
+e.g. when an instructor ends a lab before the tokens of the students expire.
+
+Every entry is removed when the tokens it revokes are expired anyway, so the store stays small. A verification of a
+token that isn't revoked costs one dictionary lookup per kind of entry, and nothing if the store is empty.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ._lazy import LazyExceptions, lazy_import
+
+
+jwt = lazy_import('jwt', globals())
+# the exceptions subclass the exceptions of PyJWT, so they are only created when they're used, see ``_lazy``
+_errors = LazyExceptions(globals(), {
+    'TokenRevokedError': (lambda: jwt.exceptions.InvalidTokenError,
+                          "Raised when a token or its lab instance was revoked."),
+})
+__getattr__ = _errors.get
+
+
+SNAPSHOT_VERSION = 1
+
+
+class RevocationStore:
+    """Thread safe set of revoked token ids and lab instances.
+
+    Tokens are revoked by their ``jti`` claim, which is added to tokens by ``TokenIssuer(issue_jti=True)`` or
+    ``generate_auth_token(..., issue_jti=True)``. Lab instances are revoked for all their tokens, including tokens
+    without ``jti``.
+
+    :param default_ttl: Seconds a lab instance stays revoked if no expiration time is given. Should be at least the maximum lifetime of the tokens.
+    :param clock: Function that returns the current UNIX time. Only needs to be changed in tests.
+    """
+
+    def __init__(self, default_ttl: float = 24 * 60 * 60, clock: Callable[[], float] = time.time):
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._jtis: Dict[str, float] = {}
+        self._lab_instances: Dict[Tuple[Any, Any], float] = {}
+
+    def revoke_token(self, jti: str, expires_at: float) -> None:
+        """Revokes a token by its id.
+
+        :param jti: The ``jti`` claim of the token.
+        :param expires_at: The ``exp`` claim of the token. The entry is removed afterwards.
+        """
+        with self._lock:
+            self._jtis[jti] = max(expires_at, self._jtis.get(jti, expires_at))
+
+    def revoke_lab_instance(self, lab_id: Any, lab_instance_id: Any, expires_at: Optional[float] = None) -> None:
+        """Revokes all tokens of a lab instance.
+
+        :param lab_id: The id of the lab.
+        :param lab_instance_id: The id of the lab instance.
+        :param expires_at: UNIX time after which the entry is removed. If None, ``default_ttl`` seconds from now.
+        """
+        if expires_at is None:
+            expires_at = self._clock() + self.default_ttl
+        key = (lab_id, lab_instance_id)
+        with self._lock:
+            self._lab_instances[key] = max(expires_at, self._lab_instances.get(key, expires_at))
+
+    def is_revoked(self, params: Any, jti: Optional[str] = None) -> bool:
+        """Checks if the token of decoded params was revoked.
+
+        :param params: The ``LabInstanceTokenParams`` of the token.
+        :param jti: The id of the token. If None, the ``jti`` attribute of the params is used.
+        :return: True if the token or its lab instance is revoked.
+        """
+        jtis = self._jtis
+        if jtis:
+            if jti is None:
+                jti = params.jti
+            if jti is not None:
+                expires_at = jtis.get(jti)
+                if expires_at is not None and self._clock() < expires_at:
+                    return True
+        lab_instances = self._lab_instances
+        if lab_instances:
+            expires_at = lab_instances.get((params.lab_id, params.lab_instance_id))
+            if expires_at is not None and self._clock() < expires_at:
+                return True
+        return False
+
+    def check(self, params: Any, jti: Optional[str] = None) -> None:
+        """Raises an exception if the token of decoded params was revoked.
+
+        :param params: The ``LabInstanceTokenParams`` of the token.
+        :param jti: The id of the token. If None, the ``jti`` attribute of the params is used.
+        :raise TokenRevokedError: Raised when the token or its lab instance is revoked.
+        """
+        if self.is_revoked(params, jti):
+            raise _errors.TokenRevokedError("Token has been revoked")
+
+    def purge_expired(self) -> int:
+        """Removes all entries whose tokens are expired.
+
+        :return: Amount of removed entries.
+        """
+        now = self._clock()
+        with self._lock:
+            jtis = {jti: expires_at for jti, expires_at in self._jtis.items() if now < expires_at}
+            lab_instances = {key: expires_at for key, expires_at in self._lab_instances.items() if now < expires_at}
+            removed = len(self._jtis) - len(jtis) + len(self._lab_instances) - len(lab_instances)
+            self._jtis = jtis
+            self._lab_instances = lab_instances
+        return removed
+
+    def save(self, path: str) -> None:
+        """Saves the entries that aren't expired to a json file. The file is replaced atomically.
+
+        :param path: Path of the snapshot file.
+        """
+        self.purge_expired()
+        with self._lock:
+            snapshot = {
+                'version': SNAPSHOT_VERSION,
+                'jtis': dict(self._jtis),
+                'lab_instances': [[lab_id, lab_instance_id, expires_at]
+                                  for (lab_id, lab_instance_id), expires_at in self._lab_instances.items()],
+            }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.revocations-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path: str) -> int:
+        """Adds the entries of a snapshot file. Expired entries are skipped.
+
+        :param path: Path of the snapshot file.
+        :return: Amount of loaded entries.
+        :raise OSError: Raised when the file can't be read.
+        :raise ValueError: Raised when the file isn't a valid snapshot.
+        """
+        with open(path, 'r') as f:
+            snapshot = json.load(f)
+        if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported revocation snapshot")
+        now = self._clock()
+        loaded = 0
+        for jti, expires_at in snapshot.get('jtis', {}).items():
+            if now < expires_at:
+                self.revoke_token(jti, expires_at)
+                loaded += 1
+        for lab_id, lab_instance_id, expires_at in snapshot.get('lab_instances', []):
+            if now < expires_at:
+                self.revoke_lab_instance(lab_id, lab_instance_id, expires_at)
+                loaded += 1
+        return loaded
+
+    def __len__(self) -> int:
+        return len(self._jtis) + len(self._lab_instances)
@@ -0,0 +1,247 @@
+"""Verified token cache in shared memory.
+
+``SharedTokenCache`` works like ``cache.VerifiedTokenCache``, but stores the verified tokens in a memory-mapped file,
+so all worker processes of a node share one cache. A reconnect that lands on another worker than the first connection
+is still a hit. On Linux the file should be in ``/dev/shm``, so it's only kept in memory.
+
+The file contains a set-associative hash table of fixed-size records. Every record consists of a sequence number, the
+digest of the cache key, the expiration time, the length and a checksum of the payload, followed by a payload area of
+``slot_size`` bytes that contains the serialized ``LabInstanceTokenParams``. Writers increment the sequence number
+before and after writing a record (seqlock) and readers only accept a record if the sequence number is even and didn't
+change and the checksum matches, so torn records are misses. No locks are shared between the processes.
+
+The file is created with permissions for the current user only. Every process that can write to it could add tokens
+that are then treated as verified.
+
+A ``multiprocessing.shared_memory`` segment isn't used, because the resource tracker of Python < 3.13 removes it when
+the first process that attached to it exits.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Any, Callable, Hashable, Optional
+
+from .auth import FrozenLabInstanceTokenParams, LabInstanceTokenParams
+from .cache import VerifiedTokenCache
+
+
+MAGIC = b'LOAUTHC1'
+WAYS = 4
+
+_HEADER = struct.Struct('<8sII')
+_HEADER_SIZE = 64
+_RECORD = struct.Struct('<I16sdI8s')
+_SEQUENCE = struct.Struct('<I')
+_PARAMS_CLASSES = (LabInstanceTokenParams, FrozenLabInstanceTokenParams)
+
+
+def _digest(key: Hashable) -> bytes:
+    parts = []
+    for part in key if isinstance(key, tuple) else (key,):
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            parts.append(bytes(part))
+        elif isinstance(part, tuple):
+            parts.append(','.join(part).encode('utf-8'))
+        elif isinstance(part, type):
+            parts.append(('%s.%s' % (part.__module__, part.__qualname__)).encode('utf-8'))
+        else:
+            parts.append(str(part).encode('utf-8'))
+    return hashlib.blake2b(b'\x00'.join(parts), digest_size=16).digest()
+
+
+def _checksum(digest: bytes, expires_at: float, payload: bytes) -> bytes:
+    return hashlib.blake2b(digest + struct.pack('<d', expires_at) + payload, digest_size=8).digest()
+
+
+class SharedTokenCache:
+    """Verified token cache in shared memory that can be used by many processes.
+
+    The parent process creates the cache and the workers attach to it by its path, e.g. in the initializer of a process
+    pool. The cache can also be pickled, which attaches to the same file. The cache can be passed to
+    ``auth.TokenVerifier`` and the functions of ``auth`` like a ``cache.VerifiedTokenCache``.
+
+    Params that don't fit into ``slot_size`` bytes aren't cached. Only ``LabInstanceTokenParams`` and
+    ``FrozenLabInstanceTokenParams`` can be cached.
+
+    :param path: Path of the file, e.g. ``/dev/shm/lab-orchestrator-tokens``.
+    :param slots: Amount of tokens that can be stored. Rounded up to a multiple of 4.
+    :param slot_size: Maximum size of the serialized params of a token in bytes.
+    :param create: If True, a new file is created. If False, an existing file is attached and ``slots`` and ``slot_size`` are read from it.
+    :param clock: Function that returns the current UNIX time. Only needs to be changed in tests.
+    :raise FileExistsError: Raised when create is True and the file already exists.
+    :raise FileNotFoundError: Raised when create is False and the file doesn't exist.
+    :raise ValueError: Raised when the file isn't a token cache.
+    """
+
+    def __init__(self, path: str, slots: int = 4096, slot_size: int = 1024, create: bool = True,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self._clock = clock
+        self.hits = 0
+        self.misses = 0
+        if create:
+            if slots <= 0 or slot_size <= 0:
+                raise ValueError("slots and slot_size need to be greater than 0")
+            slots = -(-slots // WAYS) * WAYS
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            try:
+                os.ftruncate(fd, _HEADER_SIZE + slots * (_RECORD.size + slot_size))
+                self._buf = mmap.mmap(fd, 0)
+            finally:
+                os.close(fd)
+            _HEADER.pack_into(self._buf, 0, MAGIC, slots, slot_size)
+        else:
+            fd = os.open(path, os.O_RDWR)
+            try:
+                self._buf = mmap.mmap(fd, 0)
+            finally:
+                os.close(fd)
+            magic, slots, slot_size = _HEADER.unpack_from(self._buf, 0) if len(self._buf) >= _HEADER.size \
+                else (None, 0, 0)
+            if magic != MAGIC or len(self._buf) < _HEADER_SIZE + slots * (_RECORD.size + slot_size):
+                self._buf.close()
+                raise ValueError("'%s' isn't a token cache" % path)
+        self.slots = slots
+        self.slot_size = slot_size
+        self._owner = create
+        self._stride = _RECORD.size + slot_size
+        self._sets = slots // WAYS
+
+    def __reduce__(self):
+        return self.__class__, (self.path, None, None, False, self._clock)
+
+    make_key = staticmethod(VerifiedTokenCache.make_key)
+
+    def _offsets(self, digest: bytes) -> range:
+        start = _HEADER_SIZE + (int.from_bytes(digest[:8], 'little') % self._sets) * WAYS * self._stride
+        return range(start, start + WAYS * self._stride, self._stride)
+
+    def _read(self, offset: int, digest: bytes) -> Any:
+        buf = self._buf
+        sequence, record_digest, expires_at, length, checksum = _RECORD.unpack_from(buf, offset)
+        if sequence & 1 or record_digest != digest or length > self.slot_size:
+            return None
+        payload = buf[offset + _RECORD.size:offset + _RECORD.size + length]
+        if _SEQUENCE.unpack_from(buf, offset)[0] != sequence or checksum != _checksum(digest, expires_at, payload):
+            return None
+        if self._clock() >= expires_at:
+            return None
+        try:
+            tag, lab_id, lab_instance_id, namespace_name, allowed_vmi_names, additional_data, jti = json.loads(payload)
+            return _PARAMS_CLASSES[tag].from_claims({
+                'lab_instance': {'lab_id': lab_id, 'lab_instance_id': lab_instance_id,
+                                 'namespace_name': namespace_name, 'allowed_vmi_names': allowed_vmi_names,
+                                 'additional_data': additional_data},
+                'jti': jti})
+        except (ValueError, TypeError, IndexError):
+            return None
+
+    def get(self, key: Hashable) -> "Optional[LabInstanceTokenParams]":
+        """Returns the cached data of a token.
+
+        :param key: The key created with ``make_key``.
+        :return: The cached data or None if the token is not cached, expired or its record is written at the moment.
+        """
+        digest = _digest(key)
+        for offset in self._offsets(digest):
+            params = self._read(offset, digest)
+            if params is not None:
+                self.hits += 1
+                return params
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, params: "LabInstanceTokenParams", expires_at: Optional[float] = None) -> None:
+        """Adds a verified token to the cache.
+
+        If all records of the bucket of the token are used, the record that expires first is replaced.
+
+        :param key: The key created with ``make_key``.
+        :param params: The data that is contained in the token.
+        :param expires_at: UNIX time of the ``exp`` claim. If None the entry is only replaced by newer entries.
+        """
+        now = self._clock()
+        if expires_at is None:
+            expires_at = float('inf')
+        elif now >= expires_at:
+            return
+        try:
+            tag = _PARAMS_CLASSES.index(params.__class__)
+        except ValueError:
+            return
+        payload = json.dumps([tag, params.lab_id, params.lab_instance_id, params.namespace_name,
+                              list(params.allowed_vmi_names), params.additional_data, params.jti],
+                             separators=(',', ':')).encode('utf-8')
+        if len(payload) > self.slot_size:
+            return
+        digest = _digest(key)
+        buf = self._buf
+        target = None
+        target_expires_at = None
+        for offset in self._offsets(digest):
+            _, record_digest, record_expires_at, length, _ = _RECORD.unpack_from(buf, offset)
+            if record_digest == digest or length == 0 or now >= record_expires_at:
+                target = offset
+                break
+            if target is None or record_expires_at < target_expires_at:
+                target, target_expires_at = offset, record_expires_at
+        sequence = _SEQUENCE.unpack_from(buf, target)[0] | 1
+        _SEQUENCE.pack_into(buf, target, sequence)
+        buf[target + _RECORD.size:target + _RECORD.size + len(payload)] = payload
+        _RECORD.pack_into(buf, target, sequence, digest, expires_at, len(payload),
+                          _checksum(digest, expires_at, payload))
+        _SEQUENCE.pack_into(buf, target, (sequence + 1) & 0xffffffff)
+
+    def purge_expired(self) -> int:
+        """Removes all expired entries.
+
+        :return: Amount of removed entries.
+        """
+        now = self._clock()
+        removed = 0
+        for offset in range(_HEADER_SIZE, _HEADER_SIZE + self.slots * self._stride, self._stride):
+            sequence, _, expires_at, length, _ = _RECORD.unpack_from(self._buf, offset)
+            if length and not sequence & 1 and now >= expires_at:
+                self._clear_record(offset)
+                removed += 1
+        return removed
+
+    def _clear_record(self, offset: int) -> None:
+        sequence = _SEQUENCE.unpack_from(self._buf, offset)[0] | 1
+        _RECORD.pack_into(self._buf, offset, sequence, bytes(16), 0.0, 0, bytes(8))
+        _SEQUENCE.pack_into(self._buf, offset, (sequence + 1) & 0xffffffff)
+
+    def clear(self) -> None:
+        """Removes all entries and resets the counters of this process."""
+        for offset in range(_HEADER_SIZE, _HEADER_SIZE + self.slots * self._stride, self._stride):
+            self._clear_record(offset)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        now = self._clock()
+        count = 0
+        for offset in range(_HEADER_SIZE, _HEADER_SIZE + self.slots * self._stride, self._stride):
+            _, _, expires_at, length, _ = _RECORD.unpack_from(self._buf, offset)
+            if length and now < expires_at:
+                count += 1
+        return count
+
+    def close(self) -> None:
+        """Unmaps the file in this process. The cache can't be used afterwards."""
+        self._buf.close()
+
+    def unlink(self) -> None:
+        """Removes the file. Should be called once by the process that created the cache."""
+        os.unlink(self.path)
+
+    def __enter__(self) -> "SharedTokenCache":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+        if self._owner:
+            self.unlink()
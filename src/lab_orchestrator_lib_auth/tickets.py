@@ -0,0 +1,139 @@
+"""Session tickets of LabOrchestrator auth.
+
+A websocket proxy verifies the JWT token of a client once and hands out a session ticket. Reconnects of the same lab
+session present the ticket instead of the token, which is checked with one HMAC and without json or base64 parsing.
+
+A ticket is a fixed-size binary struct::
+
+    version (1 byte) | exp (8 bytes, big endian) | session id (16 bytes) | mac (16 bytes)
+
+The session id identifies the user and the lab instance. The MAC is a truncated HMAC-SHA256 over the struct and the
+VM-name, so a ticket is only valid for the VM it was created for. Tickets are valid until the ``exp`` claim of their token,
+but by default at most ``DEFAULT_MAX_LIFETIME`` seconds.
+"""
+import hashlib
+import hmac
+import json
+import os
+import struct
+import time
+from typing import Callable, Optional, Tuple
+
+from ._lazy import LazyExceptions, lazy_import
+from .auth import Identifier, LabInstanceTokenParams, Token, TokenVerifier
+
+
+jwt = lazy_import('jwt', globals())
+# the exceptions subclass the exceptions of PyJWT, so they are only created when they're used, see ``_lazy``
+_errors = LazyExceptions(globals(), {
+    'InvalidTicketError': (lambda: jwt.exceptions.InvalidTokenError,
+                           "Raised when a ticket is malformed, forged or created for another VM."),
+    'TicketExpiredError': ('InvalidTicketError', "Raised when the token of a ticket is expired."),
+})
+__getattr__ = _errors.get
+
+
+TICKET_VERSION = 1
+TICKET_SIZE = 41
+DEFAULT_MAX_LIFETIME = 5 * 60
+
+_HEADER = struct.Struct('>BQ16s')
+_MAC_SIZE = 16
+
+
+def session_id(user_id: Identifier, params: LabInstanceTokenParams) -> bytes:
+    """Calculates the id of the lab session of a user.
+
+    :param user_id: Id of the user.
+    :param params: The data of the token.
+    :return: 16 bytes that identify the user and the lab instance.
+    """
+    data = json.dumps([user_id, params.lab_id, params.lab_instance_id, params.namespace_name], separators=(',', ':'))
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).digest()
+
+
+class SessionTickets:
+    """Mints and checks session tickets.
+
+    The ticket secret is only known to this object, so tickets of one process are rejected by other processes unless
+    they share the secret. Clients should fall back to their token if a ticket is rejected.
+
+    Tickets are not checked against a ``revocation.RevocationStore``. ``max_lifetime`` limits how long a revoked
+    session can reconnect with its ticket, afterwards the client has to present its token again.
+
+    :param verifier: Verifier of the tokens that are exchanged for tickets.
+    :param secret: Secret of the ticket MACs with at least 16 bytes. If None, a random secret is created.
+    :param max_lifetime: Maximum amount of seconds a ticket is valid. If None, it's valid as long as its token, also if the token is revoked in the meantime.
+    :param clock: Function that returns the current UNIX time. Only needs to be changed in tests.
+    :raise ValueError: Raised when the secret is too short.
+    """
+
+    def __init__(self, verifier: TokenVerifier, secret: Optional[bytes] = None, max_lifetime: Optional[int] = DEFAULT_MAX_LIFETIME,
+                 clock: Callable[[], float] = time.time):
+        if secret is None:
+            secret = os.urandom(32)
+        if len(secret) < 16:
+            raise ValueError("The ticket secret needs at least 16 bytes")
+        self.verifier = verifier
+        self.max_lifetime = max_lifetime
+        self._secret = secret
+        self._clock = clock
+
+    def _mac(self, header: bytes, vmi_name: str) -> bytes:
+        return hmac.digest(self._secret, header + vmi_name.encode('utf-8'), 'sha256')[:_MAC_SIZE]
+
+    def issue(self, user_id: Identifier, params: LabInstanceTokenParams, vmi_name: str, expires_at: float) -> bytes:
+        """Creates a ticket for data that was already verified.
+
+        :param user_id: Id of the user.
+        :param params: The verified data of the token.
+        :param vmi_name: The VM-name the ticket is valid for.
+        :param expires_at: UNIX time at which the ticket expires, usually the ``exp`` claim of the token.
+        :return: The ticket.
+        """
+        if self.max_lifetime is not None:
+            expires_at = min(expires_at, self._clock() + self.max_lifetime)
+        header = _HEADER.pack(TICKET_VERSION, int(expires_at), session_id(user_id, params))
+        return header + self._mac(header, vmi_name)
+
+    def mint(self, token: Token, vmi_name: str) -> Tuple[Optional[bytes], LabInstanceTokenParams]:
+        """Verifies a token and creates a ticket for the VM-name.
+
+        :param token: The token of the client.
+        :param vmi_name: The vmi_name the user wants to use.
+        :return: The ticket or None if the vmi_name isn't allowed in the token, and the data contained in the token.
+        :raise jwt.exceptions.InvalidTokenError: Raised when the token is invalid. See ``auth.verify_auth_token``.
+        """
+        claims = self.verifier.decode_claims(token)
+        params = self.verifier.params_class.from_claims(claims)
+        if self.verifier.revocation_store is not None:
+            self.verifier.revocation_store.check(params)
+        if not params.is_vmi_allowed(vmi_name):
+            return None, params
+        expires_at = claims.get('exp')
+        if expires_at is None:
+            if self.max_lifetime is None:
+                raise jwt.exceptions.MissingRequiredClaimError('exp')
+            expires_at = self._clock() + self.max_lifetime
+        return self.issue(claims['id'], params, vmi_name, expires_at), params
+
+    def check(self, ticket: bytes, vmi_name: str) -> Tuple[bytes, int]:
+        """Checks a ticket.
+
+        :param ticket: The ticket.
+        :param vmi_name: The vmi_name the user wants to use.
+        :return: The session id (see ``session_id``) and the UNIX time at which the ticket expires.
+        :raise InvalidTicketError: Raised when the ticket is malformed, forged or created for another VM-name.
+        :raise TicketExpiredError: Raised when the ticket is expired.
+        """
+        if len(ticket) != TICKET_SIZE:
+            raise _errors.InvalidTicketError("Invalid ticket size")
+        header = bytes(ticket[:_HEADER.size])
+        if not hmac.compare_digest(self._mac(header, vmi_name), ticket[_HEADER.size:]):
+            raise _errors.InvalidTicketError("Invalid ticket")
+        version, expires_at, session = _HEADER.unpack(header)
+        if version != TICKET_VERSION:
+            raise _errors.InvalidTicketError("Unsupported ticket version")
+        if expires_at <= self._clock():
+            raise _errors.TicketExpiredError("Ticket has expired")
+        return session, expires_at
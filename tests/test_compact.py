@@ -0,0 +1,56 @@
+import pickle
+import unittest
+
+import jwt
+
+from src.lab_orchestrator_lib_auth.auth import decode_auth_token, generate_auth_token, verify_auth_token, \
+    FrozenLabInstanceTokenParams, LabInstanceTokenParams, TokenIssuer, TokenVerifier
+from src.lab_orchestrator_lib_auth.compact import decode_vmi_names, encode_vmi_names
+
+
+class CompactTokenTestCase(unittest.TestCase):
+    secret_key = "8560e6637120e49406a631ed91d2302bc280474f26860920f1249d6f213c78b7"
+
+    def setUp(self):
+        self.param = LabInstanceTokenParams(1, 9, "pentest-3-9", ["pentest-3-9-vm-%d" % i for i in range(200)]
+                                            + ["~home", "=x", "kali"], {"course": "security"})
+
+    def test_vmi_name_encoding(self):
+        names = ["pentest-3-9-vm", "pentest-3-9", "~home", "=x", "kali", ""]
+        encoded = encode_vmi_names("pentest-3-9", names)
+
+        self.assertEqual(["~-vm", "~", "=~home", "==x", "kali", ""], encoded)
+        self.assertEqual(names, decode_vmi_names("pentest-3-9", encoded))
+        self.assertEqual(["~a"], decode_vmi_names("", encode_vmi_names("", ["~a"])))
+
+    def test_compact_and_compressed_tokens(self):
+        default = generate_auth_token(5, self.param, self.secret_key)
+        compact = generate_auth_token(5, self.param, self.secret_key, compact=True)
+        compressed = generate_auth_token(5, self.param, self.secret_key, compress=True)
+
+        self.assertLess(len(compact), len(default) * 2 // 3)
+        self.assertLess(len(compressed), len(compact))
+        self.assertEqual({"id", "exp", "li"}, set(jwt.decode(compact, self.secret_key, ["HS256"])))
+        self.assertEqual({"id", "exp", "z"}, set(jwt.decode(compressed, self.secret_key, ["HS256"])))
+        for token in (default, compact, compressed):
+            self.assertEqual(self.param, decode_auth_token(token, self.secret_key))
+            self.assertTrue(verify_auth_token(token, "pentest-3-9-vm-199", self.secret_key)[0])
+            self.assertFalse(verify_auth_token(token, "vm-199", self.secret_key)[0])
+        frozen = TokenVerifier(self.secret_key, params_class=FrozenLabInstanceTokenParams).decode(compressed)
+        self.assertEqual(self.param.freeze(), frozen)
+
+    def test_additional_data_none_and_pickled_issuer(self):
+        param = LabInstanceTokenParams(1, 9, "ns", ["ns-a"])
+        issuer = pickle.loads(pickle.dumps(TokenIssuer(self.secret_key, compress=True)))
+
+        token = issuer.generate(5, param)
+
+        self.assertTrue(issuer.compact)
+        self.assertEqual(param, decode_auth_token(token, self.secret_key))
+
+    def test_invalid_compressed_claims(self):
+        issuer = TokenIssuer(self.secret_key)
+        for claims in ({"z": "not base64!"}, {"z": "AAAA"}, {"z": 5}, {"other": 1}):
+            token = issuer.encode_claims({"id": 5, "exp": 8633272048, **claims})
+            with self.assertRaises((jwt.exceptions.DecodeError, KeyError)):
+                decode_auth_token(token, self.secret_key)
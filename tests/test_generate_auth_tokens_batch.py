@@ -0,0 +1,85 @@
+import pickle
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+
+from src.lab_orchestrator_lib_auth import auth
+from src.lab_orchestrator_lib_auth.auth import decode_auth_token, generate_auth_token, generate_auth_tokens_batch, \
+    LabInstanceTokenParams, TokenIssuer
+
+
+class GenerateAuthTokensBatchTestCase(unittest.TestCase):
+    secret_key = "8560e6637120e49406a631ed91d2302bc280474f26860920f1249d6f213c78b7"
+    expiry_time = 8633272048
+
+    def setUp(self):
+        self.items = [
+            (user_id, LabInstanceTokenParams(1, lab_instance_id, "pentest-ubuntu-3-%d" % lab_instance_id, ["ubuntu"]))
+            for user_id in range(5) for lab_instance_id in range(3)
+        ]
+
+    def test_same_tokens_as_single_generation(self):
+        tokens = generate_auth_tokens_batch(self.items, self.secret_key, expires_at=self.expiry_time)
+
+        expected = [generate_auth_token(user_id, param, self.secret_key, expires_at=self.expiry_time)
+                    for user_id, param in self.items]
+        self.assertEqual(expected, tokens)
+
+    def test_thread_pool(self):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            tokens = generate_auth_tokens_batch(self.items, self.secret_key, executor=executor)
+
+        self.assertEqual(len(self.items), len(tokens))
+        self.assertEqual([param for _, param in self.items], [decode_auth_token(token, self.secret_key) for token in tokens])
+
+    def test_asymmetric_process_pool(self):
+        with open("tests/jwtRS256.key", "r") as f:
+            private_key = f.read()
+        with open("tests/jwtRS256.key.pub", "r") as f:
+            public_key = f.read()
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            tokens = generate_auth_tokens_batch(self.items, private_key, algorithm="RS256", executor=executor,
+                                                expires_at=self.expiry_time)
+
+        self.assertEqual(generate_auth_token(4, self.items[-1][1], private_key, algorithm="RS256",
+                                             expires_at=self.expiry_time), tokens[-1])
+        self.assertEqual(self.items[0][1], decode_auth_token(tokens[0], public_key, algorithms=['RS256']))
+
+    def test_worker_prepares_the_issuer_once(self):
+        issuer = TokenIssuer(self.secret_key)
+        reference = auth._IssuerReference(issuer=issuer)
+        self.assertIs(issuer, reference.get())
+        self.assertIsNone(pickle.loads(pickle.dumps(reference)).issuer)
+
+        with mock.patch.dict(auth._worker_issuers, clear=True), \
+                mock.patch.object(TokenIssuer, "__setstate__", autospec=True,
+                                  side_effect=TokenIssuer.__setstate__) as setstate:
+            chunks = [auth._generate_chunk(pickle.loads(pickle.dumps(reference)), self.items[i:i + 5], self.expiry_time)
+                      for i in range(0, len(self.items), 5)]
+
+        self.assertEqual(1, setstate.call_count)
+        self.assertEqual(generate_auth_tokens_batch(self.items, self.secret_key, expires_at=self.expiry_time),
+                         [token for chunk in chunks for token in chunk])
+
+    def test_thread_pool_with_key_object(self):
+        with open("tests/jwtRS256.key", "rb") as f:
+            private_key = load_pem_private_key(f.read(), password=None)
+        with open("tests/jwtRS256.key.pub", "r") as f:
+            public_key = f.read()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            tokens = generate_auth_tokens_batch(self.items, private_key, algorithm="RS256", executor=executor,
+                                                expires_at=self.expiry_time)
+
+        self.assertEqual([param for _, param in self.items],
+                         [decode_auth_token(token, public_key, algorithms=['RS256']) for token in tokens])
+
+    def test_kid(self):
+        tokens = generate_auth_tokens_batch(self.items[:2], self.secret_key, kid="key-2")
+
+        self.assertEqual(["key-2", "key-2"], [jwt.get_unverified_header(token)["kid"] for token in tokens])
+        self.assertEqual(self.items[0][1], decode_auth_token(tokens[0], self.secret_key))
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import unittest
+
+import jwt
+
+from src.lab_orchestrator_lib_auth.auth import generate_auth_token, LabInstanceTokenParams
+from src.lab_orchestrator_lib_auth.jwks import JwksKeyProvider
+from src.lab_orchestrator_lib_auth.keyring import UnknownKeyIdError
+from src.lab_orchestrator_lib_auth.revocation import RevocationStore, TokenRevokedError
+
+
+class JwksKeyProviderTestCase(unittest.TestCase):
+    def setUp(self):
+        with open("tests/jwtRS256.key", "r") as f:
+            self.private_key = f.read()
+        with open("tests/jwtRS256.key.pub", "r") as f:
+            rsa = jwt.algorithms.RSAAlgorithm(jwt.algorithms.RSAAlgorithm.SHA256)
+            self.jwk = json.loads(rsa.to_jwk(rsa.prepare_key(f.read())))
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "jwks.json")
+        self.now = [0.0]
+        self.param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu"])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, path, *keys, mtime=None):
+        with open(path, "w") as f:
+            json.dump({"keys": list(keys)}, f)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_load_file_and_select_key(self):
+        self.write(self.path, {**self.jwk, "kid": "rsa-1"}, {"kty": "oct", "k": "c2VjcmV0", "kid": "enc", "use": "enc"},
+                   {"kty": "RSA", "n": "AQAB", "e": "AQAB"})
+        provider = JwksKeyProvider(self.path)
+        token = generate_auth_token(5, self.param, self.private_key, algorithm="RS256", kid="rsa-1")
+
+        self.assertEqual(["rsa-1"], provider.kids)
+        self.assertEqual((True, self.param), provider.verify_auth_token(token, "ubuntu"))
+        self.assertRaises(UnknownKeyIdError, provider.decode_auth_token,
+                          generate_auth_token(5, self.param, self.private_key, algorithm="RS256", kid="enc"))
+        self.assertEqual([], JwksKeyProvider(self.path, algorithms=["ES256"]).kids)
+
+    def test_stale_while_revalidate(self):
+        self.write(self.path, {**self.jwk, "kid": "rsa-1"}, mtime=1000)
+        provider = JwksKeyProvider(self.path, check_interval=10, clock=lambda: self.now[0])
+        old_verifier = provider.get_verifier("rsa-1")
+        new_token = generate_auth_token(5, self.param, self.private_key, algorithm="RS256", kid="rsa-2")
+
+        self.write(self.path, {**self.jwk, "kid": "rsa-1"}, {**self.jwk, "kid": "rsa-2"}, mtime=2000)
+        self.assertRaises(UnknownKeyIdError, provider.decode_auth_token, new_token)
+        self.now[0] = 10
+        self.assertIs(old_verifier, provider.get_verifier("rsa-1"))
+        provider.wait()
+
+        self.assertEqual(self.param, provider.decode_auth_token(new_token))
+        self.assertIs(old_verifier, provider.get_verifier("rsa-1"))
+
+    def test_failed_reload_keeps_old_keys(self):
+        self.write(self.path, {**self.jwk, "kid": "rsa-1"}, mtime=1000)
+        provider = JwksKeyProvider(self.path, background=False, clock=lambda: self.now[0])
+        with open(self.path, "w") as f:
+            f.write('{"keys": [')
+
+        self.now[0] = 5
+        self.assertTrue(provider.refresh())
+
+        self.assertEqual(["rsa-1"], provider.kids)
+        self.assertIsInstance(provider.last_error, ValueError)
+
+    def test_invalid_keys_are_reported(self):
+        self.write(self.path, {**self.jwk, "kid": "rsa-1"}, mtime=1000)
+        provider = JwksKeyProvider(self.path, clock=lambda: self.now[0])
+        contents = [({"keys": [{"kid": "rsa-2", "alg": "RS256"}]}, jwt.exceptions.InvalidKeyError),
+                    ([{**self.jwk, "kid": "rsa-2"}], ValueError), ({"keys": ["rsa-2"]}, ValueError),
+                    ({"keys": {"kid": "rsa-2"}}, ValueError)]
+        for mtime, (content, error) in enumerate(contents, 2000):
+            with open(self.path, "w") as f:
+                json.dump(content, f)
+            os.utime(self.path, (mtime, mtime))
+            self.now[0] += 5
+
+            self.assertTrue(provider.refresh())
+            provider.wait()
+
+            self.assertIsInstance(provider.last_error, error)
+            self.assertEqual(["rsa-1"], provider.kids)
+            self.assertRaises(error, JwksKeyProvider, self.path)
+
+    def test_load_directory(self):
+        self.write(os.path.join(self.directory.name, "a.json"), {**self.jwk, "kid": "a"})
+        with open(os.path.join(self.directory.name, "b.json"), "w") as f:
+            json.dump({**self.jwk, "kid": "b"}, f)
+        with open(os.path.join(self.directory.name, "notes.txt"), "w") as f:
+            f.write("ignored")
+
+        provider = JwksKeyProvider(self.directory.name, background=False)
+
+        self.assertEqual(["a", "b"], provider.kids)
+
+    def test_revocation_store(self):
+        self.write(self.path, {**self.jwk, "kid": "rsa-1"})
+        store = RevocationStore()
+        provider = JwksKeyProvider(self.path, revocation_store=store)
+        token = generate_auth_token(5, self.param, self.private_key, algorithm="RS256", kid="rsa-1")
+        self.assertEqual(self.param, provider.decode_auth_token(token))
+
+        store.revoke_lab_instance(1, 9)
+
+        self.assertRaises(TokenRevokedError, provider.decode_auth_token, token)
@@ -0,0 +1,86 @@
+import unittest
+from unittest import mock
+
+import jwt
+
+from src.lab_orchestrator_lib_auth.auth import generate_auth_token, LabInstanceTokenParams
+from src.lab_orchestrator_lib_auth.keyring import KeyRing, UnknownKeyIdError, read_unverified_kid
+from src.lab_orchestrator_lib_auth.revocation import RevocationStore, TokenRevokedError
+
+
+class KeyRingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = [1000.0]
+        self.keyring = KeyRing(clock=lambda: self.now[0])
+        self.param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu"])
+
+    def test_kid_header_and_key_selection(self):
+        self.keyring.add_key("2021-10", "old-secret")
+        old_token = self.keyring.generate_auth_token(5, self.param, expires_at=8633272048)
+        self.keyring.add_key("2021-11", "new-secret", activates_at=1000.5)
+        self.now[0] = 1001.0
+        new_token = self.keyring.generate_auth_token(5, self.param, expires_at=8633272048)
+
+        self.assertEqual("2021-10", read_unverified_kid(old_token))
+        self.assertEqual("2021-11", read_unverified_kid(new_token))
+        with mock.patch("jwt.decode", wraps=jwt.decode) as decode:
+            self.assertEqual((True, self.param), self.keyring.verify_auth_token(old_token, "ubuntu"))
+            self.assertEqual(self.param, self.keyring.decode_auth_token(new_token))
+            self.assertEqual(2, decode.call_count)
+
+    def test_scheduled_rollover(self):
+        self.keyring.add_key("a", "secret-a")
+        self.keyring.add_key("b", "secret-b", activates_at=2000)
+        self.keyring.retire_key("a", retires_at=3000)
+
+        self.assertEqual("pending", self.keyring.state("b"))
+        self.assertIsNone(self.keyring.active_kid())
+        self.now[0] = 2000
+        self.assertEqual("active", self.keyring.state("b"))
+        self.assertEqual("retiring", self.keyring.state("a"))
+        token = generate_auth_token(5, self.param, "secret-a", expires_at=8633272048, kid="a")
+        self.assertEqual(self.param, self.keyring.decode_auth_token(token))
+
+        self.now[0] = 3000
+        self.assertEqual("expired", self.keyring.state("a"))
+        self.assertRaises(UnknownKeyIdError, self.keyring.decode_auth_token, token)
+        self.assertEqual(["a"], self.keyring.remove_expired_keys())
+
+    def test_unknown_and_missing_kid(self):
+        self.keyring.add_key("a", "secret-a")
+        token_without_kid = generate_auth_token(5, self.param, "secret-a")
+
+        self.assertRaises(UnknownKeyIdError, self.keyring.decode_auth_token, token_without_kid)
+        self.assertRaises(UnknownKeyIdError, self.keyring.decode_auth_token,
+                          generate_auth_token(5, self.param, "secret-a", kid="x"))
+        self.assertRaises(jwt.exceptions.DecodeError, self.keyring.decode_auth_token, "not-a-token")
+        self.keyring.fallback_kid = "a"
+        self.assertEqual(self.param, self.keyring.decode_auth_token(token_without_kid))
+        self.assertRaises(ValueError, self.keyring.add_key, "a", "other")
+
+    def test_asymmetric_keys(self):
+        with open("tests/jwtRS256.key", "r") as f:
+            private_key = f.read()
+        with open("tests/jwtRS256.key.pub", "r") as f:
+            public_key = f.read()
+        signer = KeyRing()
+        signer.add_key("rsa", private_key, algorithm="RS256")
+        proxy = KeyRing()
+        proxy.add_key("rsa", verification_key=public_key, algorithm="RS256")
+
+        token = signer.generate_auth_token(5, self.param)
+
+        self.assertEqual({"typ": "JWT", "alg": "RS256", "kid": "rsa"}, jwt.get_unverified_header(token))
+        self.assertEqual((False, self.param), proxy.verify_auth_token(token, "manjaro"))
+        self.assertRaises(UnknownKeyIdError, proxy.generate_auth_token, 5, self.param)
+
+    def test_revocation_store(self):
+        store = RevocationStore()
+        keyring = KeyRing(revocation_store=store)
+        keyring.add_key("a", "secret-a")
+        token = keyring.generate_auth_token(5, self.param)
+        self.assertTrue(keyring.verify_auth_token(token, "ubuntu")[0])
+
+        store.revoke_lab_instance(1, 9)
+
+        self.assertRaises(TokenRevokedError, keyring.verify_auth_token, token, "ubuntu")
@@ -0,0 +1,85 @@
+import subprocess
+import sys
+import unittest
+
+
+SCRIPT = """
+import sys
+from src.lab_orchestrator_lib_auth import auth, compact, json_codec
+print('jwt' in sys.modules, 'cryptography' in sys.modules, 'orjson' in sys.modules)
+params = auth.LabInstanceTokenParams(1, 9, 'pentest-ubuntu-3-9', ['ubuntu'])
+token = auth.generate_auth_token(5, params, 'secret', compress=True)
+print(auth.verify_auth_token(token, 'ubuntu', 'secret')[0], auth.jwt is sys.modules['jwt'])
+"""
+
+MODULES_SCRIPT = """
+import pickle
+import sys
+from src.lab_orchestrator_lib_auth import aio, auth, jwks, keyring, parallel, revocation, tickets
+print('jwt' in sys.modules, 'cryptography' in sys.modules)
+ring = keyring.KeyRing()
+ring.add_key('a', 'secret')
+params = auth.LabInstanceTokenParams(1, 9, 'pentest-ubuntu-3-9', ['ubuntu'])
+token = ring.generate_auth_token(5, params)
+print('jwt' in sys.modules)
+import jwt
+from src.lab_orchestrator_lib_auth.keyring import UnknownKeyIdError
+from src.lab_orchestrator_lib_auth.tickets import InvalidTicketError, TicketExpiredError
+store = revocation.RevocationStore()
+store.revoke_lab_instance(1, 9)
+ring = keyring.KeyRing(revocation_store=store)
+ring.add_key('a', 'secret')
+try:
+    ring.decode_auth_token(token)
+except jwt.exceptions.InvalidTokenError as e:
+    print(type(e) is revocation.TokenRevokedError, type(pickle.loads(pickle.dumps(e))) is type(e))
+print(issubclass(UnknownKeyIdError, jwt.exceptions.InvalidTokenError), keyring.UnknownKeyIdError is UnknownKeyIdError,
+      issubclass(TicketExpiredError, InvalidTicketError), TicketExpiredError.__module__, hasattr(tickets, 'Missing'))
+"""
+
+CONCURRENT_SCRIPT = """
+import threading
+from src.lab_orchestrator_lib_auth import auth
+params = auth.LabInstanceTokenParams(1, 9, 'pentest-ubuntu-3-9', ['ubuntu'])
+barrier = threading.Barrier(16)
+errors = []
+
+def first_use(index):
+    barrier.wait()
+    try:
+        if index % 2:
+            auth.generate_auth_token(5, params, 'secret')
+        else:
+            auth.verify_auth_token(auth.TokenIssuer('secret').generate(5, params), 'ubuntu', 'secret')
+    except Exception as e:
+        errors.append(repr(e))
+
+threads = [threading.Thread(target=first_use, args=(i,)) for i in range(16)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print(errors)
+"""
+
+
+class LazyImportTestCase(unittest.TestCase):
+    def run_script(self, script):
+        return subprocess.run([sys.executable, "-c", script], check=True, stdout=subprocess.PIPE,
+                              universal_newlines=True).stdout.splitlines()
+
+    def test_jwt_is_loaded_on_first_use(self):
+        self.assertEqual(["False False False", "True True"], self.run_script(SCRIPT))
+
+    def test_other_modules_load_jwt_on_first_use(self):
+        self.assertEqual(["False False", "True", "True True",
+                          "True True True src.lab_orchestrator_lib_auth.tickets False"],
+                         self.run_script(MODULES_SCRIPT))
+
+    def test_concurrent_first_use(self):
+        for _ in range(3):
+            self.assertEqual(["[]"], self.run_script(CONCURRENT_SCRIPT))
+
+
+if __name__ == '__main__':
+    unittest.main()
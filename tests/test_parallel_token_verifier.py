@@ -0,0 +1,50 @@
+import unittest
+
+import jwt
+
+from src.lab_orchestrator_lib_auth.auth import generate_auth_token, LabInstanceTokenParams
+from src.lab_orchestrator_lib_auth.parallel import ParallelTokenVerifier
+from src.lab_orchestrator_lib_auth.revocation import RevocationStore, TokenRevokedError
+
+
+class ParallelTokenVerifierTestCase(unittest.TestCase):
+    def setUp(self):
+        with open("tests/jwtRS256.key", "r") as f:
+            private_key = f.read()
+        with open("tests/jwtRS256.key.pub", "r") as f:
+            self.public_key = f.read()
+        self.param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu"])
+        self.token = generate_auth_token(5, self.param, private_key, algorithm="RS256")
+
+    def test_process_pool(self):
+        with ParallelTokenVerifier(self.public_key, algorithms=['RS256'], max_workers=2) as verifier:
+            self.assertEqual(self.param, verifier.submit_decode(self.token).result())
+            self.assertEqual((False, self.param), verifier.submit_verify(self.token, "manjaro").result())
+
+            pairs = [(self.token, "ubuntu"), ("not-a-token", "ubuntu")] * 5
+            results = list(verifier.verify_batch(pairs, chunksize=3))
+
+        self.assertEqual([True, False] * 5, [result.success for result in results])
+        self.assertIsInstance(results[1].error, jwt.exceptions.DecodeError)
+
+    def test_thread_pool(self):
+        with ParallelTokenVerifier(self.public_key, algorithms=['RS256'], max_workers=2, use_threads=True) as verifier:
+            self.assertEqual((True, self.param), verifier.submit_verify(self.token, "ubuntu").result())
+            self.assertRaises(jwt.exceptions.DecodeError, verifier.submit_decode("not-a-token").result)
+
+    def test_revocation_store(self):
+        for use_threads in (False, True):
+            store = RevocationStore()
+            with ParallelTokenVerifier(self.public_key, algorithms=['RS256'], max_workers=2, use_threads=use_threads,
+                                       revocation_store=store) as verifier:
+                self.assertTrue(verifier.submit_verify(self.token, "ubuntu").result()[0])
+                store.revoke_lab_instance(1, 9)
+
+                self.assertRaises(TokenRevokedError, verifier.submit_decode(self.token).result)
+                self.assertRaises(TokenRevokedError, verifier.submit_verify(self.token, "ubuntu").result)
+                results = list(verifier.verify_batch([(self.token, "ubuntu"), ("not-a-token", "ubuntu")]))
+
+            self.assertEqual([False, False], [result.success for result in results])
+            self.assertIsInstance(results[0].error, TokenRevokedError)
+            self.assertIsNone(results[0].params)
+            self.assertIsInstance(results[1].error, jwt.exceptions.DecodeError)
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import pickle
+import tempfile
+import unittest
+
+import jwt
+
+from src.lab_orchestrator_lib_auth.aio import decode_auth_token_async, verify_auth_token_async
+from src.lab_orchestrator_lib_auth.auth import decode_auth_token, generate_auth_token, verify_auth_token, \
+    authorize_vmi_names, verify_auth_tokens_batch, FrozenLabInstanceTokenParams, LabInstanceTokenParams, TokenVerifier
+from src.lab_orchestrator_lib_auth.cache import VerifiedTokenCache
+from src.lab_orchestrator_lib_auth.json_codec import StdlibJsonCodec
+from src.lab_orchestrator_lib_auth.revocation import RevocationStore, TokenRevokedError
+
+
+class RevocationStoreTestCase(unittest.TestCase):
+    secret_key = "8560e6637120e49406a631ed91d2302bc280474f26860920f1249d6f213c78b7"
+
+    def setUp(self):
+        self.now = [1000.0]
+        self.store = RevocationStore(default_ttl=100, clock=lambda: self.now[0])
+        self.param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu"])
+
+    def test_issue_jti(self):
+        token = generate_auth_token(5, self.param, self.secret_key, issue_jti=True)
+        other = generate_auth_token(5, self.param, self.secret_key, issue_jti=True)
+
+        params = decode_auth_token(token, self.secret_key)
+        frozen = TokenVerifier(self.secret_key, params_class=FrozenLabInstanceTokenParams).decode(token)
+
+        self.assertEqual(jwt.decode(token, self.secret_key, ["HS256"])["jti"], params.jti)
+        self.assertNotEqual(params.jti, decode_auth_token(other, self.secret_key).jti)
+        self.assertEqual(self.param, params)
+        self.assertEqual(params.jti, frozen.jti)
+        self.assertEqual(params.jti, pickle.loads(pickle.dumps(frozen)).jti)
+        self.assertEqual(params.jti, frozen.thaw().jti)
+        self.assertIsNone(decode_auth_token(generate_auth_token(5, self.param, self.secret_key), self.secret_key).jti)
+
+    def test_revoke_token_and_lab_instance(self):
+        token = generate_auth_token(5, self.param, self.secret_key, issue_jti=True, compact=True)
+        other = generate_auth_token(5, LabInstanceTokenParams(1, 10, "ns", ["ubuntu"]), self.secret_key)
+        cache = VerifiedTokenCache()
+        verifier = TokenVerifier(self.secret_key, cache=cache, revocation_store=self.store)
+        self.assertTrue(verifier.verify(token, "ubuntu")[0])
+
+        self.store.revoke_token(decode_auth_token(token, self.secret_key).jti, 1050)
+
+        self.assertRaises(TokenRevokedError, verifier.verify, token, "ubuntu")
+        self.assertRaises(TokenRevokedError, verify_auth_token, token, "ubuntu", self.secret_key,
+                          revocation_store=self.store)
+        self.assertTrue(verify_auth_token(other, "ubuntu", self.secret_key, revocation_store=self.store)[0])
+        self.store.revoke_lab_instance(1, 10)
+        self.assertRaises(TokenRevokedError, decode_auth_token, other, self.secret_key, revocation_store=self.store)
+        results = list(verifier.verify_batch([(token, "ubuntu")]))
+        self.assertIsInstance(results[0].error, TokenRevokedError)
+
+        self.now[0] = 1050
+        self.assertTrue(verifier.verify(token, "ubuntu")[0])
+        self.assertEqual(1, self.store.purge_expired())
+        self.now[0] = 1100
+        self.assertEqual(1, self.store.purge_expired())
+        self.assertEqual(0, len(self.store))
+
+    def test_all_functions_check_the_store(self):
+        token = generate_auth_token(5, self.param, self.secret_key, issue_jti=True)
+        codec = StdlibJsonCodec()
+        self.assertEqual({"ubuntu": True}, authorize_vmi_names(token, ["ubuntu"], self.secret_key, json_codec=codec,
+                                                               revocation_store=self.store)[0])
+        self.store.revoke_lab_instance(1, 9)
+
+        self.assertRaises(TokenRevokedError, authorize_vmi_names, token, ["ubuntu"], self.secret_key,
+                          json_codec=codec, revocation_store=self.store)
+        results = list(verify_auth_tokens_batch([(token, "ubuntu")], self.secret_key, json_codec=codec,
+                                                revocation_store=self.store))
+        self.assertIsInstance(results[0].error, TokenRevokedError)
+        for function, args in [(decode_auth_token_async, (token, self.secret_key)),
+                               (verify_auth_token_async, (token, "ubuntu", self.secret_key))]:
+            with self.assertRaises(TokenRevokedError):
+                asyncio.run(function(*args, json_codec=codec, revocation_store=self.store))
+        self.assertTrue(asyncio.run(verify_auth_token_async(token, "ubuntu", self.secret_key, json_codec=codec))[0])
+
+    def test_snapshot(self):
+        self.store.revoke_token("a", 1050)
+        self.store.revoke_token("b", 2000)
+        self.store.revoke_lab_instance("lab", 9, 2000)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "revocations.json")
+            self.store.save(path)
+            self.now[0] = 1100
+            store = RevocationStore(clock=lambda: self.now[0])
+
+            self.assertEqual(2, store.load(path))
+            self.assertEqual(["revocations.json"], os.listdir(directory))
+
+            with open(path, "w") as f:
+                f.write('{"version": 99}')
+            self.assertRaises(ValueError, store.load, path)
+        self.assertTrue(store.is_revoked(LabInstanceTokenParams("lab", 9, "ns", []), jti="x"))
+        self.assertTrue(store.is_revoked(self.param, jti="b"))
+        self.assertFalse(store.is_revoked(self.param, jti="a"))
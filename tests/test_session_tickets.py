@@ -0,0 +1,67 @@
+import unittest
+from unittest import mock
+
+import jwt
+
+from src.lab_orchestrator_lib_auth.auth import generate_auth_token, LabInstanceTokenParams, TokenVerifier
+from src.lab_orchestrator_lib_auth.revocation import RevocationStore, TokenRevokedError
+from src.lab_orchestrator_lib_auth.tickets import session_id, InvalidTicketError, SessionTickets, \
+    TicketExpiredError, DEFAULT_MAX_LIFETIME, TICKET_SIZE
+
+
+class SessionTicketsTestCase(unittest.TestCase):
+    secret_key = "8560e6637120e49406a631ed91d2302bc280474f26860920f1249d6f213c78b7"
+
+    def setUp(self):
+        self.now = [1000.0]
+        self.param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu", "worker-*"])
+        self.token = generate_auth_token(5, self.param, self.secret_key, expires_at=8633272048.5)
+        self.verifier = TokenVerifier(self.secret_key)
+        self.tickets = SessionTickets(self.verifier, max_lifetime=None, clock=lambda: self.now[0])
+
+    def test_mint_and_check(self):
+        ticket, params = self.tickets.mint(self.token, "worker-1")
+
+        self.assertEqual(self.param, params)
+        self.assertEqual(TICKET_SIZE, len(ticket))
+        with mock.patch("jwt.decode") as decode:
+            self.assertEqual((session_id(5, self.param), 8633272048), self.tickets.check(ticket, "worker-1"))
+            self.assertEqual((session_id(5, self.param), 8633272048), self.tickets.check(memoryview(ticket), "worker-1"))
+            decode.assert_not_called()
+        self.assertNotEqual(session_id("5", self.param), session_id(5, self.param))
+
+    def test_rejected_tickets(self):
+        ticket, _ = self.tickets.mint(self.token, "ubuntu")
+        self.assertEqual((None, self.param), self.tickets.mint(self.token, "manjaro"))
+
+        forged = ticket[:1] + (8633272049).to_bytes(8, "big") + ticket[9:]
+        self.assertRaises(InvalidTicketError, self.tickets.check, ticket, "worker-1")
+        self.assertRaises(InvalidTicketError, self.tickets.check, forged, "ubuntu")
+        self.assertRaises(InvalidTicketError, self.tickets.check, ticket[:-1], "ubuntu")
+        self.assertRaises(InvalidTicketError, SessionTickets(self.verifier).check, ticket, "ubuntu")
+        self.now[0] = 8633272048
+        self.assertRaises(TicketExpiredError, self.tickets.check, ticket, "ubuntu")
+        self.assertRaises(jwt.exceptions.InvalidSignatureError, self.tickets.mint,
+                          generate_auth_token(5, self.param, "other-secret"), "ubuntu")
+        self.assertRaises(ValueError, SessionTickets, self.verifier, b"short")
+
+    def test_max_lifetime_and_revocation(self):
+        store = RevocationStore()
+        verifier = TokenVerifier(self.secret_key, revocation_store=store)
+        tickets = SessionTickets(verifier, secret=b"0123456789abcdef", max_lifetime=60, clock=lambda: self.now[0])
+        token = generate_auth_token(5, self.param, self.secret_key)
+
+        ticket, _ = tickets.mint(token, "ubuntu")
+
+        self.assertEqual(1060, tickets.check(ticket, "ubuntu")[1])
+        store.revoke_lab_instance(1, 9)
+        self.assertRaises(TokenRevokedError, tickets.mint, token, "ubuntu")
+
+    def test_default_max_lifetime(self):
+        tickets = SessionTickets(self.verifier, clock=lambda: self.now[0])
+
+        ticket, _ = tickets.mint(self.token, "ubuntu")
+
+        self.assertEqual(1000 + DEFAULT_MAX_LIFETIME, tickets.check(ticket, "ubuntu")[1])
+        self.now[0] += DEFAULT_MAX_LIFETIME
+        self.assertRaises(TicketExpiredError, tickets.check, ticket, "ubuntu")
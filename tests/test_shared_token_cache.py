@@ -0,0 +1,154 @@
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from src.lab_orchestrator_lib_auth.auth import generate_auth_token, verify_auth_token, \
+    FrozenLabInstanceTokenParams, LabInstanceTokenParams, TokenVerifier
+from src.lab_orchestrator_lib_auth.shared_cache import SharedTokenCache, _digest
+
+SECRET_KEY = "8560e6637120e49406a631ed91d2302bc280474f26860920f1249d6f213c78b7"
+
+
+def _decode_in_worker(verifier, token):
+    return verifier.decode(token), verifier.cache.hits
+
+
+class SharedTokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "tokens")
+        self.now = [1000.0]
+        self.cache = SharedTokenCache(self.path, slots=16, slot_size=256, clock=lambda: self.now[0])
+        self.param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu"])
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def test_put_get(self):
+        key = SharedTokenCache.make_key("token", SECRET_KEY, ["HS256"])
+
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, self.param, 1100)
+        params = self.cache.get(key)
+
+        self.assertEqual(self.param, params)
+        self.assertEqual(self.param.allowed_vmi_names, params.allowed_vmi_names)
+        self.assertEqual(self.param.additional_data, params.additional_data)
+        self.assertIsNone(self.cache.get(SharedTokenCache.make_key("token", SECRET_KEY, ["HS512"])))
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+        self.assertEqual(1, len(self.cache))
+
+    def test_verifier(self):
+        token = generate_auth_token(5, self.param, SECRET_KEY)
+        cache = SharedTokenCache(os.path.join(self.directory, "verifier"))
+        frozen = TokenVerifier(SECRET_KEY, cache=cache, params_class=FrozenLabInstanceTokenParams)
+        try:
+            self.assertEqual((True, self.param), verify_auth_token(token, "ubuntu", SECRET_KEY, cache=cache))
+            self.assertEqual((True, self.param), verify_auth_token(token, "ubuntu", SECRET_KEY, cache=cache))
+            self.assertIsInstance(frozen.decode(token), FrozenLabInstanceTokenParams)
+            self.assertIsInstance(frozen.decode(token), FrozenLabInstanceTokenParams)
+            self.assertEqual((False, self.param), verify_auth_token(token, "other", SECRET_KEY, cache=cache))
+            self.assertEqual((3, 2), (cache.hits, cache.misses))
+        finally:
+            cache.close()
+
+    def test_attach(self):
+        key = SharedTokenCache.make_key("token", SECRET_KEY, ["HS256"])
+        self.cache.put(key, self.param, 8633272048)
+
+        attached = SharedTokenCache(self.path, create=False)
+        copy = pickle.loads(pickle.dumps(TokenVerifier(SECRET_KEY, cache=attached))).cache
+        try:
+            self.assertEqual((16, 256), (attached.slots, attached.slot_size))
+            self.assertEqual(self.param, attached.get(key))
+            self.assertEqual(self.param, copy.get(key))
+            attached.put(SharedTokenCache.make_key("other", SECRET_KEY, ["HS256"]), self.param, 8633272048)
+            self.assertEqual(2, len(self.cache))
+        finally:
+            attached.close()
+            copy.close()
+        with self.assertRaises(FileExistsError):
+            SharedTokenCache(self.path)
+        with self.assertRaises(FileNotFoundError):
+            SharedTokenCache(os.path.join(self.directory, "missing"), create=False)
+        with open(os.path.join(self.directory, "invalid"), "wb") as f:
+            f.write(bytes(128))
+        with self.assertRaises(ValueError):
+            SharedTokenCache(os.path.join(self.directory, "invalid"), create=False)
+
+    def test_processes(self):
+        token = generate_auth_token(5, self.param, SECRET_KEY)
+        cache = SharedTokenCache(os.path.join(self.directory, "processes"))
+        verifier = TokenVerifier(SECRET_KEY, cache=cache)
+        try:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                params, hits = executor.submit(_decode_in_worker, verifier, token).result()
+            self.assertEqual(self.param, params)
+            self.assertEqual(0, hits)
+            self.assertEqual(self.param, verifier.decode(token))
+            self.assertEqual(1, cache.hits)
+        finally:
+            cache.close()
+
+    def test_expiry(self):
+        key = SharedTokenCache.make_key("token", SECRET_KEY, ["HS256"])
+        self.cache.put(key, self.param, 1100)
+        self.cache.put(SharedTokenCache.make_key("expired", SECRET_KEY, ["HS256"]), self.param, 900)
+        self.cache.put(SharedTokenCache.make_key("forever", SECRET_KEY, ["HS256"]), self.param)
+
+        self.assertEqual(2, len(self.cache))
+        self.now[0] = 1100
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(1, len(self.cache))
+        self.assertEqual(1, self.cache.purge_expired())
+        self.cache.clear()
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual((0, 0), (self.cache.hits, self.cache.misses))
+
+    def test_eviction(self):
+        for i in range(100):
+            self.cache.put(SharedTokenCache.make_key("token%d" % i, SECRET_KEY, ["HS256"]), self.param, 1100 + i)
+
+        self.assertEqual(16, len(self.cache))
+        self.assertEqual(self.param, self.cache.get(SharedTokenCache.make_key("token99", SECRET_KEY, ["HS256"])))
+
+    def test_not_cached(self):
+        key = SharedTokenCache.make_key("token", SECRET_KEY, ["HS256"])
+        self.cache.put(key, LabInstanceTokenParams(1, 9, "ns", ["ubuntu"], {"data": "x" * 300}), 1100)
+
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(0, len(self.cache))
+
+    def test_torn_record(self):
+        key = SharedTokenCache.make_key("token", SECRET_KEY, ["HS256"])
+        self.cache.put(key, self.param, 1100)
+        offset = next(offset for offset in self.cache._offsets(_digest(key))
+                      if self.cache._read(offset, _digest(key)) is not None)
+        buf = self.cache._buf
+        sequence = struct.unpack_from("<I", buf, offset)[0]
+
+        struct.pack_into("<I", buf, offset, sequence + 1)
+        self.assertIsNone(self.cache.get(key))
+        struct.pack_into("<I", buf, offset, sequence)
+        self.assertEqual(self.param, self.cache.get(key))
+        buf[offset + 60] ^= 0xff
+        self.assertIsNone(self.cache.get(key))
+
+    def test_context_manager(self):
+        path = os.path.join(self.directory, "owned")
+        with SharedTokenCache(path):
+            with SharedTokenCache(path, create=False):
+                pass
+            self.assertTrue(os.path.exists(path))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(0o600, os.stat(self.path).st_mode & 0o777)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from unittest import mock
+
+import jwt
+
+from src.lab_orchestrator_lib_auth.auth import generate_auth_token, verify_auth_token_staged, \
+    LabInstanceTokenParams, TokenIssuer, TokenVerifier
+from src.lab_orchestrator_lib_auth.cache import VerifiedTokenCache
+from src.lab_orchestrator_lib_auth.revocation import RevocationStore, TokenRevokedError
+
+
+class VerifyAuthTokenStagedTestCase(unittest.TestCase):
+    secret_key = "8560e6637120e49406a631ed91d2302bc280474f26860920f1249d6f213c78b7"
+
+    def setUp(self):
+        self.param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu", "worker-*"])
+        self.token = generate_auth_token(5, self.param, self.secret_key, expires_at=8633272048)
+
+    def test_accepted_token(self):
+        result = verify_auth_token_staged(self.token, "worker-1", self.secret_key)
+
+        self.assertTrue(result.success)
+        self.assertIsNone(result.stage)
+        self.assertIsNone(result.error)
+        self.assertEqual(self.param, result.params)
+
+    def test_rejected_before_signature(self):
+        expired = generate_auth_token(5, self.param, self.secret_key, expires_at=1000)
+        issuer = TokenIssuer(self.secret_key)
+        cases = [
+            ("a.b", "structure", jwt.exceptions.DecodeError),
+            (self.token + "!", "structure", jwt.exceptions.DecodeError),
+            (issuer.encode_claims({"id": 5}), "structure", KeyError),
+            (generate_auth_token(5, self.param, self.secret_key, algorithm="HS512"), "structure",
+             jwt.exceptions.InvalidAlgorithmError),
+            (expired, "expiry", jwt.exceptions.ExpiredSignatureError),
+            (generate_auth_token(5, self.param, self.secret_key, compact=True), None, None),
+        ]
+        with mock.patch("jwt.api_jws.decode_complete", wraps=jwt.api_jws.decode_complete) as decode_complete:
+            for token, stage, error in cases:
+                result = verify_auth_token_staged(token, "ubuntu", self.secret_key)
+                self.assertEqual(stage, result.stage)
+                if error is not None:
+                    self.assertIsInstance(result.error, error)
+                    self.assertIsNone(result.params)
+            exact = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu", "pentest-ubuntu-3-9-kali"])
+            forbidden = [verify_auth_token_staged(generate_auth_token(5, exact, self.secret_key, compact=compact),
+                                                  vmi_name, self.secret_key)
+                         for compact in (False, True) for vmi_name in ("manjaro", "ubuntu*")]
+            self.assertEqual(1, decode_complete.call_count)
+
+        for result in forbidden:
+            self.assertEqual(("vmi", None, None), (result.stage, result.params, result.error))
+            self.assertFalse(result.success)
+
+    def test_wildcards_and_compressed_claims_are_checked_after_signature(self):
+        tokens = [self.token, generate_auth_token(5, self.param, self.secret_key, compress=True),
+                  generate_auth_token(5, LabInstanceTokenParams(1, 9, "ns", ["ubuntu"]), self.secret_key,
+                                      compress=True)]
+        with mock.patch("jwt.api_jws.decode_complete", wraps=jwt.api_jws.decode_complete) as decode_complete:
+            for token in tokens:
+                result = verify_auth_token_staged(token, "manjaro", self.secret_key)
+                self.assertEqual(("vmi", None), (result.stage, result.error))
+                self.assertIsNotNone(result.params)
+            self.assertEqual(len(tokens), decode_complete.call_count)
+        self.assertTrue(verify_auth_token_staged(tokens[1], "worker-2", self.secret_key).success)
+
+    def test_params_are_built_from_verified_claims(self):
+        issuer = TokenIssuer("other-secret")
+        forged = [
+            generate_auth_token(5, self.param, "other-secret", compress=True),
+            issuer.encode_claims({"id": 5, "z": "not compressed"}),
+            issuer.encode_claims({"id": 5, "lab_instance": {"allowed_vmi_names": ["worker-*"]}}),
+        ]
+        with mock.patch.object(LabInstanceTokenParams, "from_claims") as from_claims:
+            for token in forged:
+                result = verify_auth_token_staged(token, "worker-1", self.secret_key)
+                self.assertEqual("signature", result.stage)
+                self.assertIsInstance(result.error, jwt.exceptions.InvalidSignatureError)
+            from_claims.assert_not_called()
+
+        signed = TokenIssuer(self.secret_key).encode_claims({"id": 5, "z": "not compressed"})
+        result = verify_auth_token_staged(signed, "worker-1", self.secret_key)
+        self.assertEqual("structure", result.stage)
+        self.assertIsInstance(result.error, jwt.exceptions.DecodeError)
+
+    def test_non_finite_exp(self):
+        header = jwt.utils.base64url_encode(b'{"typ":"JWT","alg":"HS256"}').decode()
+        for exp in ("Infinity", "-Infinity", "NaN", "1e400"):
+            payload = jwt.utils.base64url_encode(
+                ('{"id":5,"exp":%s,"lab_instance":{"allowed_vmi_names":["ubuntu"]}}' % exp).encode()).decode()
+
+            result = verify_auth_token_staged("%s.%s.c2ln" % (header, payload), "ubuntu", self.secret_key)
+
+            self.assertEqual("expiry", result.stage)
+            self.assertIsInstance(result.error, jwt.exceptions.DecodeError)
+
+    def test_forged_token_is_rejected_at_signature(self):
+        forged = generate_auth_token(5, self.param, "other-secret")
+
+        result = verify_auth_token_staged(forged, "ubuntu", self.secret_key)
+
+        self.assertEqual("signature", result.stage)
+        self.assertIsInstance(result.error, jwt.exceptions.InvalidSignatureError)
+        self.assertIsNone(result.params)
+
+    def test_cache_and_revocation(self):
+        cache = VerifiedTokenCache()
+        store = RevocationStore()
+        verifier = TokenVerifier(self.secret_key, cache=cache, revocation_store=store)
+        self.assertTrue(verifier.verify_staged(self.token, "ubuntu").success)
+        self.assertEqual(1, len(cache))
+
+        with mock.patch("jwt.api_jws.decode_complete") as decode_complete:
+            self.assertEqual("vmi", verifier.verify_staged(self.token, "manjaro").stage)
+            store.revoke_lab_instance(1, 9)
+            result = verifier.verify_staged(self.token, "ubuntu")
+            decode_complete.assert_not_called()
+
+        self.assertEqual("revocation", result.stage)
+        self.assertIsInstance(result.error, TokenRevokedError)
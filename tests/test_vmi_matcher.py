@@ -0,0 +1,56 @@
+import pickle
+import unittest
+
+from src.lab_orchestrator_lib_auth.auth import authorize_vmi_names, generate_auth_token, verify_auth_token, \
+    LabInstanceTokenParams, VmiMatcher
+
+
+class VmiMatcherTestCase(unittest.TestCase):
+    secret_key = "8560e6637120e49406a631ed91d2302bc280474f26860920f1249d6f213c78b7"
+
+    def test_names_and_patterns(self):
+        matcher = VmiMatcher(["ubuntu", "worker-*", "db-[ab]"])
+
+        self.assertEqual(frozenset(["ubuntu"]), matcher.names)
+        self.assertIn("ubuntu", matcher)
+        self.assertIn("worker-17", matcher)
+        self.assertIn("db-a", matcher)
+        self.assertNotIn("db-c", matcher)
+        self.assertNotIn("Worker-1", matcher)
+        self.assertNotIn("ubuntu-2", matcher)
+        self.assertNotIn("manjaro", VmiMatcher([]))
+
+    def test_authorize_many_vmis(self):
+        param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu", "worker-*"])
+        token = generate_auth_token(5, param, self.secret_key)
+
+        allowed, data = authorize_vmi_names(token, ["ubuntu", "worker-3", "manjaro"], self.secret_key)
+
+        self.assertEqual({"ubuntu": True, "worker-3": True, "manjaro": False}, allowed)
+        self.assertEqual(param, data)
+        self.assertTrue(verify_auth_token(token, "worker-12", self.secret_key)[0])
+
+    def test_matcher_is_built_on_demand(self):
+        param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu", "kali"])
+        token = generate_auth_token(5, param, self.secret_key)
+
+        allowed, data = verify_auth_token(token, "kali", self.secret_key)
+        self.assertTrue(allowed)
+        self.assertFalse(data.is_vmi_allowed("manjaro"))
+        self.assertIsNone(data._built_vmi_matcher())
+
+        with_patterns = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["ubuntu", "worker-*"])
+        self.assertTrue(with_patterns.is_vmi_allowed("ubuntu"))
+        self.assertIsNone(with_patterns._built_vmi_matcher())
+        self.assertTrue(with_patterns.is_vmi_allowed("worker-3"))
+        self.assertFalse(with_patterns.is_vmi_allowed("worker"))
+        self.assertIsNotNone(with_patterns._built_vmi_matcher())
+
+    def test_params_stay_comparable_and_picklable(self):
+        param = LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["worker-*"])
+        self.assertTrue(param.is_vmi_allowed("worker-1"))
+
+        copy = pickle.loads(pickle.dumps(param))
+
+        self.assertEqual(LabInstanceTokenParams(1, 9, "pentest-ubuntu-3-9", ["worker-*"]), copy)
+        self.assertTrue(copy.is_vmi_allowed("worker-2"))